@@ -0,0 +1,167 @@
+"""
+The user_outage_matches table: every located user within the alert radius of
+every active outage. Proximity work happens when an outage appears or a user
+moves, and the index page and the notifier only read the table.
+"""
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select, update
+from geo import outage_locations
+from matching import match_users_to_outages
+from models import Notification, Outage, User, UserOutageMatch
+from proximity import SubscriberRow, resolve_backend, subscribers_near
+from sub_areas import awaiting_geocoding, outage_points
+
+INSERT_CHUNK_SIZE = 5000
+
+NearbyOutage = namedtuple("NearbyOutage", "id area sub_areas outage_date outage_time distance_km")
+
+
+def _insert_matches(session, rows):
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        session.execute(insert(UserOutageMatch), rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def refresh_pending_outages(session, default_radius_km):
+    """
+    Matches every active outage whose matched_at is NULL (new, reappeared, or
+    never matched since the table was added, or whose sub-area points moved)
+    against all located users, each within their own alert radius. Outages
+    still waiting for their sub-areas to be geocoded are left for a later
+    run (see sub_areas.awaiting_geocoding). Nothing is committed. Returns
+    (outages matched, match rows written).
+    """
+    now = datetime.utcnow()
+    outages = session.query(Outage).filter(
+        Outage.retired_at.is_(None),
+        Outage.matched_at.is_(None),
+        ~awaiting_geocoding(now),
+    ).all()
+    if not outages:
+        return 0, 0
+
+    outage_ids = [outage.id for outage in outages]
+    session.execute(
+        delete(UserOutageMatch)
+        .where(UserOutageMatch.outage_id.in_(outage_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+    # The database narrows candidates with the widest radius in use; the
+    # matcher then applies each user's own.
+    widest_radius_km = session.scalar(
+        select(func.max(func.coalesce(User.alert_radius_km, default_radius_km)))
+    ) or default_radius_km
+
+    points = outage_points(session, outage_ids)
+    locations = [location for outage in outages for location in outage_locations(outage, points)]
+
+    connection = session.connection()
+    users = subscribers_near(
+        connection, locations, widest_radius_km, resolve_backend(connection), subscribed_only=False
+    )
+
+    rows = [
+        {"user_id": user.id, "outage_id": outage.id, "distance_km": distance, "matched_at": now}
+        for user, user_alerts in match_users_to_outages(users, outages, default_radius_km, points=points)
+        for outage, distance in user_alerts
+    ]
+    _insert_matches(session, rows)
+
+    session.execute(
+        update(Outage)
+        .where(Outage.id.in_(outage_ids))
+        .values(matched_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return len(outages), len(rows)
+
+
+def replace_user_matches(session, user_id, nearby):
+    """
+    Replaces a user's matches with nearby, a list of (distance_km, outage_id)
+    for the user's current location (empty when they have none). Nothing is
+    committed.
+    """
+    session.execute(
+        delete(UserOutageMatch)
+        .where(UserOutageMatch.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    now = datetime.utcnow()
+    _insert_matches(session, [
+        {"user_id": user_id, "outage_id": outage_id, "distance_km": distance, "matched_at": now}
+        for distance, outage_id in nearby
+    ])
+
+
+def rematch_user(session, user, default_radius_km):
+    """
+    Rewrites one user's matches for their saved location, the same way
+    refresh_pending_outages writes them: through match_users_to_outages,
+    against the sub-area points of every active outage that has been
+    matched. Outages still pending pick the user up when they are matched.
+    Nothing is committed. Returns the number of matches written.
+    """
+    nearby = []
+    if user.latitude is not None and user.longitude is not None:
+        outages = session.execute(
+            select(Outage.id, Outage.latitude, Outage.longitude)
+            .where(Outage.retired_at.is_(None), Outage.matched_at.isnot(None))
+        ).all()
+        points = outage_points(session, [outage.id for outage in outages])
+        nearby = [
+            (distance, outage.id)
+            for _, user_alerts in match_users_to_outages([user], outages, default_radius_km, points=points)
+            for outage, distance in user_alerts
+        ]
+    replace_user_matches(session, user.id, nearby)
+    return len(nearby)
+
+
+def nearby_outages_for_user(session, user_id):
+    """The user's active matched outages as NearbyOutage rows, closest first."""
+    rows = session.execute(
+        select(
+            Outage.id, Outage.area, Outage.sub_areas, Outage.outage_date, Outage.outage_time,
+            UserOutageMatch.distance_km,
+        )
+        .join(UserOutageMatch, UserOutageMatch.outage_id == Outage.id)
+        .where(UserOutageMatch.user_id == user_id, Outage.retired_at.is_(None))
+        .order_by(UserOutageMatch.distance_km)
+    )
+    return [NearbyOutage(*row) for row in rows]
+
+
+def pending_alerts(session):
+    """
+    Subscribed users with matched active outages they were not notified
+    about yet, in the (user, [(outage, distance_km), ...]) shape
+    outbox.enqueue_alerts takes. One query over the materialized matches.
+    """
+    rows = session.execute(
+        select(
+            User.id, User.email, User.latitude, User.longitude, User.alert_radius_km, User.phone_number,
+            Outage, UserOutageMatch.distance_km,
+        )
+        .join(UserOutageMatch, UserOutageMatch.user_id == User.id)
+        .join(Outage, Outage.id == UserOutageMatch.outage_id)
+        .outerjoin(
+            Notification,
+            (Notification.user_id == UserOutageMatch.user_id)
+            & (Notification.outage_id == UserOutageMatch.outage_id),
+        )
+        .where(
+            User.is_subscribed == True,
+            Outage.retired_at.is_(None),
+            Notification.user_id.is_(None),
+        )
+        .order_by(User.id, UserOutageMatch.distance_km)
+    )
+
+    alerts = []
+    for user_id, email, lat, lon, radius_km, phone_number, outage, distance in rows:
+        if not alerts or alerts[-1][0].id != user_id:
+            alerts.append((SubscriberRow(user_id, email, lat, lon, radius_km, phone_number), []))
+        alerts[-1][1].append((outage, distance))
+    return alerts
@@ -1,89 +1,63 @@
 from flask import Flask ,jsonify, request,redirect,url_for,session, render_template
 from flask_dance.contrib.google import make_google_blueprint ,google
 from flask_cors import CORS
-from scrape_data import run_full_outage_pipeline
-from models import Outage, User,Base
-from flask_apscheduler import APScheduler
-from dotenv import load_dotenv
+from models import User
+from geo import (
+    DEFAULT_ALERT_RADIUS_KM, MAX_ALERT_RADIUS_KM, MIN_ALERT_RADIUS_KM, nearby_many, outage_entry, outage_index,
+)
+from db import SessionLocal, db_session, engine, init_app
+from logs import configure_logging
+import metrics
+from versions import OUTAGES, VersionWatcher
+from read_models import fetch_active_outages, serialize_outage_list
+from proximity import PROXIMITY_BACKEND, outages_near, resolve_backend
+from outbox import delete_user_alerts
+from push import PUSH_REFUSED_RETRY_SECONDS, OutageBroadcaster, StreamSlots, outage_stream
+from alert_matches import nearby_outages_for_user, rematch_user, replace_user_matches
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-import math,os
+from sqlalchemy.exc import IntegrityError
+import logging
+import os
 
-THRESHOLD_KM = 20
+logger = logging.getLogger(__name__)
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculates the great-circle distance between two points 
-    on the surface of a sphere (Earth) using the Haversine formula.
-    Returns distance in kilometers.
-    """
-    # Convert degrees to radians
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    # Haversine formula components
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = 6371 * c
-    return distance
+# Limits for /api/check_outage/batch.
+BATCH_MAX_POINTS = int(os.getenv("BATCH_MAX_POINTS", 1000))
+BATCH_MAX_RADIUS_KM = float(os.getenv("BATCH_MAX_RADIUS_KM", 100))
 
+# How long a web worker trusts its cached outage data version before
+# re-reading it; new pipeline runs show up within this many seconds.
+DATA_VERSION_CHECK_SECONDS = int(os.getenv("DATA_VERSION_CHECK_SECONDS", 5))
 
+configure_logging()
 
-load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-SMTP_SERVER = os.getenv('SMTP_SERVER')
-SMTP_PORT = int(os.getenv('SMTP_PORT')) 
-SENDER_EMAIL = os.getenv('SENDER_EMAIL')
-SENDER_PASSWORD = os.getenv('SENDER_PASSWORD')
-DB_URL = os.getenv("DATABASE_URL")
-
-
-if DB_URL and DB_URL.startswith("postgres://"):
-    DB_URL = DB_URL.replace("postgres://", "postgresql://", 1)
-
-final_db_url = DB_URL or 'sqlite:///outages.db'
-
-engine = create_engine(final_db_url)
-
-Base.metadata.create_all(engine)
-
-SessionLocal = sessionmaker(bind=engine)
+init_app(app)
+metrics.init_app(app)
 
+outage_versions = VersionWatcher(SessionLocal, OUTAGES, DATA_VERSION_CHECK_SECONDS)
+# (data version, serialised JSON body) of the last /api/outages payload.
+_outages_payload = (None, None)
+# Database proximity mode, resolved on first use when PROXIMITY_BACKEND is not "memory".
+proximity_backend = None
 
+# {outage_id: entry} for unfiltered streams, the same rows as /api/outages
+# including outages that are not geocoded yet (the index skips those).
+_stream_outages = {}
 
+def refresh_outage_index(version):
+    global _stream_outages
+    with engine.connect() as connection:
+        outage_index.rebuild(connection, version)
+        _stream_outages = {
+            entry["id"]: entry for entry in serialize_outage_list(fetch_active_outages(connection))
+        }
 
-
-app.config['SCHEDULER_JOBDEFAULTS']={
-    "coalesce":True,
-    "max_instances":1
-}
-scheduler = APScheduler()
-scheduler.init_app(app)
-
-scheduler.add_job(
-    id='full_pipeline_job',
-    func=run_full_outage_pipeline, 
-    kwargs={
-        "session":SessionLocal,
-        'SENDER_EMAIL': SENDER_EMAIL,
-        'SENDER_PASSWORD': SENDER_PASSWORD,
-        'SMTP_SERVER': SMTP_SERVER,
-        'SMTP_PORT': SMTP_PORT
-    },
-    trigger='interval',
-    hours=24, 
-    # seconds=60, # For testing purposes
-    misfire_grace_time=3600*36
-)
+# Started by the first /api/outages/stream request.
+outage_broadcaster = OutageBroadcaster(SessionLocal, refresh_outage_index)
+stream_slots = StreamSlots()
 
 
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_OAUTH_CLIENT_ID')
@@ -105,34 +79,80 @@ app.register_blueprint(google_blueprint, url_prefix="/login")
 @app.route('/')
 def index():
     user_email = session.get('email') 
-    return render_template('index.html', user_email=user_email)
+    nearby_outages = []
+    if 'user_id' in session:
+        nearby_outages = nearby_outages_for_user(db_session, session['user_id'])
+    return render_template('index.html', user_email=user_email, nearby_outages=nearby_outages)
+
+def build_outages_payload():
+    with engine.connect() as connection:
+        rows = fetch_active_outages(connection)
+    return app.json.dumps(serialize_outage_list(rows))
 
 @app.route('/api/outages')
 def get_outages():
-    db_session = SessionLocal()
+    global _outages_payload
     try:
-        outages = db_session.query(Outage).all() #returns list of Outage objects
-        
-        outages_list = []
-        for outage in outages:
-            sub_areas_list = outage.sub_areas.split(",") if outage.sub_areas else []
+        version, updated_at = outage_versions.current()
 
-            outages_list.append({
-                "id": outage.id,
-                "area": outage.area,
-                "sub_areas" : sub_areas_list,
-                # "status": outage.
-                "date" : outage.outage_date.isoformat() if outage.outage_date else None,
-                "time" : outage.outage_time.isoformat() if outage.outage_time else None,
-            })
+        cached_version, body = _outages_payload
+        if body is None or cached_version != version:
+            body = build_outages_payload()
+            _outages_payload = (version, body)
 
-        return jsonify(outages_list)
+        response = app.response_class(body, mimetype="application/json")
+        response.set_etag(f"outages-v{version}")
+        if updated_at:
+            response.last_modified = updated_at
+        # Let browsers keep the copy but revalidate it on every page load.
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
 
     except Exception as e:
-        print(f"Database Error: {e}")
+        logger.exception("Could not build the outages payload: %s", e)
         return jsonify({'error':'Couldnt retrieve outage data.'}), 500
-    finally:
-        db_session.close()
+
+@app.route('/api/outages/stream')
+def stream_outages():
+    """
+    Server-Sent Events feed of outage changes. With lat/lon only outages
+    within radius_km (default DEFAULT_ALERT_RADIUS_KM) of that point are sent, with
+    their distance. See push.outage_stream for the event format. Beyond
+    PUSH_MAX_STREAMS open streams per process the answer is a 503.
+    """
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius_km = request.args.get('radius_km', default=DEFAULT_ALERT_RADIUS_KM, type=float)
+
+    if (lat is None) != (lon is None):
+        return jsonify({"status": "ERROR", "message": "Pass both lat and lon, or neither."}), 400
+    if not 0 < radius_km <= BATCH_MAX_RADIUS_KM:
+        return jsonify({"status": "ERROR", "message": f"radius_km must be between 0 and {BATCH_MAX_RADIUS_KM:g}."}), 400
+
+    def snapshot():
+        if lat is None:
+            return _stream_outages
+        return {
+            entry["id"]: {**entry, "distance_km": round(distance, 2)}
+            for distance, entry in outage_index.nearby(lat, lon, radius_km)
+        }
+
+    if not stream_slots.try_acquire():
+        response = jsonify({"status": "ERROR", "message": "Too many open streams; poll /api/outages instead."})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(PUSH_REFUSED_RETRY_SECONDS)
+        return response
+
+    response = app.response_class(
+        outage_stream(outage_broadcaster, snapshot),
+        mimetype="text/event-stream",
+    )
+    # Runs when the server closes the response, whether or not the stream started.
+    response.call_on_close(stream_slots.release)
+    response.headers["Cache-Control"] = "no-cache"
+    # Stops nginx-style proxies from buffering the stream.
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 @app.route("/api/register", methods = ['POST'])
 def register_user():
@@ -149,8 +169,6 @@ def register_user():
     latitude = data['latitude']
     longitude = data['longitude']
 
-    db_session = SessionLocal()
-
     try:
         existing_user = db_session.query(User).filter_by(email = email).first()
         if existing_user:
@@ -174,10 +192,59 @@ def register_user():
     
     except Exception as e:
         db_session.rollback()
-        print(f"Registration Error: {e}")
+        logger.exception("Registration error: %s", e)
         return jsonify({"status": "ERROR", "message": "Internal server error during registration."}), 500
-    finally:
-        db_session.close()
+
+def find_nearby_outages(lat, lon, radius_km):
+    """
+    (distance_km, outage entry) pairs within radius_km, closest first, from
+    the in-memory index or, when PROXIMITY_BACKEND says so, the database.
+    """
+    global proximity_backend
+
+    if PROXIMITY_BACKEND == "memory":
+        return current_outage_index().nearby(lat, lon, radius_km)
+
+    with engine.connect() as connection:
+        if proximity_backend is None:
+            proximity_backend = resolve_backend(connection)
+        matches = outages_near(connection, lat, lon, radius_km, proximity_backend)
+    return [(distance, outage_entry(outage)) for distance, outage in matches]
+
+def refresh_user_matches(user):
+    """Rewrites the user's materialized outage matches for their saved location. Not committed."""
+    rematch_user(db_session, user, DEFAULT_ALERT_RADIUS_KM)
+
+def current_outage_index():
+    """The in-memory index, rebuilt first if the outage data changed."""
+    version, _ = outage_versions.current()
+    if outage_index.version != version:
+        refresh_outage_index(version)
+    return outage_index
+
+def find_nearby_outages_many(lats, lons, radii_km):
+    """find_nearby_outages for many points, in one vectorised pass over the active outages."""
+    if PROXIMITY_BACKEND == "memory":
+        return current_outage_index().nearby_many(lats, lons, radii_km)
+
+    with engine.connect() as connection:
+        entries = [
+            outage_entry(outage) for outage in fetch_active_outages(connection)
+            if outage.latitude is not None and outage.longitude is not None
+        ]
+    return nearby_many(
+        lats, lons, radii_km,
+        [entry["latitude"] for entry in entries], [entry["longitude"] for entry in entries], entries,
+    )
+
+def proximate_outage(distance, outage):
+    return {
+        "area": outage["area"],
+        "sub_areas": outage["sub_areas"],
+        "date": outage["date"],
+        "time": outage["time"],
+        "distance_km": round(distance, 2)
+    }
 
 @app.route('/api/check_outage',methods=["GET"])
 def check_outage_query():
@@ -192,41 +259,16 @@ def check_outage_query():
     except ValueError:
         return jsonify({"status": "ERROR", "message": "Latitude and longitude must be valid numbers."}), 400
 
-    db_session = SessionLocal()
     proximate_outages = []
 
     try:
-        outages = db_session.query(Outage).all()
-        
-        for outage in outages:
-            sub_areas_list = outage.sub_areas.split(', ') if outage.sub_areas else []
-
-            if outage.latitude is None or outage.longitude is None:
-                    continue
-
-            outage_lat = outage.latitude
-            outage_lon = outage.longitude
-
-            if not isinstance(outage_lat, (int, float)) or not isinstance(outage_lon, (int, float)):
-                 print(f"Skipping outage {outage.id}: Invalid coordinates defined in simulation.")
-                 continue
-
-            distance = haversine_distance(user_lat, user_lon, outage_lat, outage_lon)
-            print(distance)
-            if distance <= THRESHOLD_KM:
-                proximate_outages.append({
-                    "area": outage.area,
-                    "sub_areas": sub_areas_list,
-                    "date": outage.outage_date.isoformat() if outage.outage_date else None,
-                    "time": outage.outage_time.isoformat() if outage.outage_time else None,
-                    "distance_km": round(distance, 2)
-                })
-            # print("out of for loop")
+        for distance, outage in find_nearby_outages(user_lat, user_lon, DEFAULT_ALERT_RADIUS_KM):
+            proximate_outages.append(proximate_outage(distance, outage))
         
         if proximate_outages:
             response_data = {
             "status": "ALERT",
-            "message": f"Found {len(proximate_outages)} scheduled outage(s) within {THRESHOLD_KM} km of your location.",
+            "message": f"Found {len(proximate_outages)} scheduled outage(s) within {DEFAULT_ALERT_RADIUS_KM} km of your location.",
             "outages": proximate_outages
             }
             return jsonify(response_data), 200
@@ -238,11 +280,67 @@ def check_outage_query():
             return jsonify(response_data), 200
 
     except Exception as e:
-        print(f"Error in making outage data query: {e}") 
+        logger.exception("Outage check failed: %s", e)
         return jsonify({"status": "ERROR", "message": "Internal error during outage check. See server console for details."}), 500
-        
-    finally:
-        db_session.close()
+
+def _batch_point(point):
+    """(lat, lon, radius_km) from one batch entry; raises ValueError if it is invalid."""
+    if not isinstance(point, dict):
+        raise ValueError("each point must be an object with lat and lon")
+    try:
+        lat = float(point["lat"])
+        lon = float(point["lon"])
+        radius_km = float(point.get("radius_km", DEFAULT_ALERT_RADIUS_KM))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("lat, lon and radius_km must be valid numbers")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat/lon out of range")
+    if not 0 < radius_km <= BATCH_MAX_RADIUS_KM:
+        raise ValueError(f"radius_km must be between 0 and {BATCH_MAX_RADIUS_KM:g}")
+    return lat, lon, radius_km
+
+@app.route('/api/check_outage/batch', methods=["POST"])
+def check_outage_batch():
+    """
+    Checks many sites in one request. Body: {"points": [{"lat", "lon",
+    "radius_km" (optional), "id" (optional, echoed back)}, ...]}. Results
+    come back in the same order as the points.
+    """
+    data = request.get_json(silent=True)
+    points = data.get("points") if isinstance(data, dict) else None
+    if not isinstance(points, list) or not points:
+        return jsonify({"status": "ERROR", "message": "Body must be JSON with a non-empty 'points' array."}), 400
+    if len(points) > BATCH_MAX_POINTS:
+        return jsonify({"status": "ERROR", "message": f"At most {BATCH_MAX_POINTS} points per request."}), 413
+
+    parsed = []
+    for i, point in enumerate(points):
+        try:
+            parsed.append(_batch_point(point))
+        except ValueError as e:
+            return jsonify({"status": "ERROR", "message": f"Point {i}: {e}."}), 400
+
+    lats, lons, radii = zip(*parsed)
+    try:
+        matches = find_nearby_outages_many(lats, lons, radii)
+    except Exception as e:
+        logger.exception("Batch outage check failed: %s", e)
+        return jsonify({"status": "ERROR", "message": "Internal error during outage check."}), 500
+
+    results = []
+    for point, (lat, lon, radius_km), point_matches in zip(points, parsed, matches):
+        result = {
+            "lat": lat,
+            "lon": lon,
+            "radius_km": radius_km,
+            "status": "ALERT" if point_matches else "CLEAR",
+            "outages": [proximate_outage(distance, outage) for distance, outage in point_matches],
+        }
+        if "id" in point:
+            result["id"] = point["id"]
+        results.append(result)
+
+    return jsonify({"status": "OK", "count": len(results), "results": results}), 200
 
 @app.route("/google/authorized")
 def google_authorized():
@@ -258,11 +356,9 @@ def google_authorized():
         else:
             return redirect(url_for("register"))
     except Exception as e:
-        print(f"Failed to fethc user inof form google: {e}")
+        logger.exception("Failed to fetch user info from Google: %s", e)
         return jsonify({"status":"ERROR","message":"Failed to retrieve user data form google."}), 500
     
-    db_session= SessionLocal()
-
     try:
         user = db_session.query(User).filter_by(email=email).first()
         if user is None:
@@ -275,11 +371,11 @@ def google_authorized():
             db_session.commit()
 
             user = new_user
-            print(f"New user created: {email}, pending setup: {full_name}")
+            logger.info("New user created: %s, pending setup", email)
 
         else:
             session['user_name'] = user.name if user.name else user.email
-            print(f"Existing user logged in: {user.email}")
+            logger.info("Existing user logged in: %s", user.email)
 
         session["user_id"] = user.id
         session['email'] = user.email
@@ -293,18 +389,14 @@ def google_authorized():
 
     except Exception as e:
         db_session.rollback()
-        print(f"Database error during Google login: {e}")
+        logger.exception("Database error during Google login: %s", e)
         return jsonify({"status": "ERROR", "message": "Internal database error during login."}), 500
     
-    finally:
-        db_session.close()
-    
 @app.route('/setup_location', methods=['GET', 'POST'])
 def setup_location():
     if 'user_id' not in session:
         return redirect(url_for('login'))
         
-    db_session = SessionLocal()
     try:
         user = db_session.query(User).filter_by(id=session['user_id']).one()
 
@@ -329,8 +421,7 @@ def setup_location():
                 user.phone_number = phone if phone else None
                 user.is_subscribed = is_subscribed
 
-
-            
+                refresh_user_matches(user)
                 db_session.commit()
                 return jsonify({"status": "SUCCESS", "message": "Location and Preferences saved!"}), 200
             else:
@@ -342,10 +433,8 @@ def setup_location():
         return redirect(url_for('logout'))
     except Exception as e:
         db_session.rollback()
-        print(f"Location setup error: {e}")
+        logger.exception("Location setup error: %s", e)
         return jsonify({"status": "ERROR", "message": "Internal error."}), 500
-    finally:
-        db_session.close()
 
 @app.route("/login")
 def login():
@@ -363,10 +452,8 @@ def profile_management():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    db_session = SessionLocal()
     try:
         user = db_session.query(User).filter_by(id=session['user_id']).one()
-        print(user)
         
         if request.method == 'POST':
             data = request.json
@@ -378,6 +465,24 @@ def profile_management():
             if lat is not None and lon is not None:
                 user.latitude = float(lat)
                 user.longitude = float(lon)
+
+            radius = data.get('alert_radius_km')
+            if radius in (None, ''):
+                user.alert_radius_km = None
+            else:
+                try:
+                    radius = float(radius)
+                except (TypeError, ValueError):
+                    radius = None
+                if radius is None or not MIN_ALERT_RADIUS_KM <= radius <= MAX_ALERT_RADIUS_KM:
+                    db_session.rollback()
+                    return jsonify({
+                        "status": "ERROR",
+                        "message": f"Alert radius must be between {MIN_ALERT_RADIUS_KM} and {MAX_ALERT_RADIUS_KM} km.",
+                    }), 400
+                user.alert_radius_km = radius
+
+            refresh_user_matches(user)
             
             db_session.commit()
             
@@ -387,15 +492,16 @@ def profile_management():
 
         return render_template('profile_management.html', 
                                user=user, 
-                               is_subscribed=user.is_subscribed) 
+                               is_subscribed=user.is_subscribed,
+                               default_radius_km=DEFAULT_ALERT_RADIUS_KM,
+                               min_radius_km=MIN_ALERT_RADIUS_KM,
+                               max_radius_km=MAX_ALERT_RADIUS_KM) 
     except NoResultFound:
         return redirect(url_for('logout'))
     except Exception as e:
         db_session.rollback()
-        print(f"Profile management error: {e}")
+        logger.exception("Profile management error: %s", e)
         return jsonify({"status": "ERROR", "message": f"Internal error.{e}"}), 500
-    finally:
-        db_session.close()
 
 @app.route('/delete_account', methods=['POST'])
 
@@ -403,10 +509,11 @@ def delete_account():
     if 'user_id' not in session:
         return jsonify({"status": "ERROR", "message": "Not logged in"}), 401
 
-    db_session = SessionLocal()
     try:
         user = db_session.query(User).filter_by(id=session['user_id']).one()
         
+        replace_user_matches(db_session, user.id, [])
+        delete_user_alerts(db_session, user.id)
         db_session.delete(user)
         db_session.commit()
         
@@ -419,22 +526,8 @@ def delete_account():
         return jsonify({"status": "ERROR", "message": "User not found."}), 404
     except Exception as e:
         db_session.rollback()
-        print(f"Account deletion error: {e}")
+        logger.exception("Account deletion error: %s", e)
         return jsonify({"status": "ERROR", "message": "Internal error."}), 500
-    finally:
-        db_session.close()
-
-
-with SessionLocal() as initial_session: 
-    run_full_outage_pipeline(
-        session=initial_session, 
-        SENDER_EMAIL=SENDER_EMAIL,
-        SENDER_PASSWORD=SENDER_PASSWORD,
-        SMTP_SERVER=SMTP_SERVER,
-        SMTP_PORT=SMTP_PORT
-    )
-    
-scheduler.start()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,34 @@
+"""
+Runs the whole benchmark suite and writes one JSON report.
+
+    python -m benchmarks [--users 1000,100000,1000000] [--output bench.json]
+"""
+import argparse
+import sys
+
+from benchmarks.harness import emit, run_isolated
+
+SUITE = ("bench_read_path", "bench_parser", "bench_api", "bench_pipeline")
+# Benchmarks that seed users at several scales.
+USER_SCALED = ("bench_api", "bench_pipeline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1000,100000,1000000")
+    parser.add_argument("--only", help="comma separated subset of " + ", ".join(SUITE))
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    selected = args.only.split(",") if args.only else SUITE
+    report = {}
+    for name in selected:
+        print(f"Running {name}...", file=sys.stderr)
+        report[name] = run_isolated(
+            f"benchmarks.{name}", ["--users", args.users] if name in USER_SCALED else []
+        )
+    emit({"python": sys.version.split()[0], "benchmarks": report}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Latency and throughput of /api/check_outage, /api/check_outage/batch and
+/api/outages through the Flask test client, against SQLite seeded with
+synthetic users and outages.
+
+    python -m benchmarks.bench_api [--users 1000,100000,1000000] [--outages 2000]
+                                   [--requests 2000] [--concurrency 1,4] [--batch-points 100]
+                                   [--output api.json]
+
+Set PROXIMITY_BACKEND to benchmark a database-side proximity mode.
+"""
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.harness import emit, random_point, run_scales, seed_outages, seed_users, summarize
+
+
+def measure(app, make_path, requests, concurrency, headers=None, expect=200, make_json=None):
+    """
+    Issues `requests` requests split over `concurrency` threads, each with its
+    own client. GETs, or POSTs when make_json builds a body.
+    """
+    samples = []
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        local = []
+        for _ in range(per_thread):
+            path = make_path(rng)
+            body = make_json(rng) if make_json else None
+            started = time.perf_counter()
+            if body is None:
+                response = client.get(path, headers=headers)
+            else:
+                response = client.post(path, json=body, headers=headers)
+            local.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == expect, (path, response.status_code)
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started)
+
+
+def check_outage_path(rng):
+    lat, lon = random_point(rng)
+    return f"/api/check_outage?lat={lat:.5f}&lon={lon:.5f}"
+
+
+def batch_body(points):
+    def make_json(rng):
+        return {"points": [dict(zip(("lat", "lon"), random_point(rng))) for _ in range(points)]}
+    return make_json
+
+
+def run_single_scale(args):
+    import db
+
+    started = time.perf_counter()
+    db.init_db()
+    seed_users(db.engine, args.users)
+    seed_outages(db.engine, args.outages)
+    seed_seconds = time.perf_counter() - started
+
+    from app import app
+
+    client = app.test_client()
+    # Warm the outage payload cache and proximity index before timing.
+    etag = client.get("/api/outages").headers["ETag"]
+    client.get(check_outage_path(random.Random(0)))
+
+    concurrency = [int(n) for n in args.concurrency.split(",")]
+    return {
+        "users": args.users,
+        "outages": args.outages,
+        "seed_seconds": round(seed_seconds, 2),
+        "check_outage": {
+            str(c): measure(app, check_outage_path, args.requests, c) for c in concurrency
+        },
+        # One request per batch; divide the latency by batch_points for per-point cost.
+        "check_outage_batch": {
+            str(c): measure(app, lambda rng: "/api/check_outage/batch", max(1, args.requests // args.batch_points), c,
+                            make_json=batch_body(args.batch_points))
+            for c in concurrency
+        },
+        "batch_points": args.batch_points,
+        "get_outages": {
+            str(c): measure(app, lambda rng: "/api/outages", args.requests, c) for c in concurrency
+        },
+        "get_outages_not_modified": {
+            str(c): measure(app, lambda rng: "/api/outages", args.requests, c,
+                            headers={"If-None-Match": etag}, expect=304)
+            for c in concurrency
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1000,100000,1000000")
+    parser.add_argument("--outages", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", default="1,4")
+    parser.add_argument("--batch-points", type=int, default=100)
+    parser.add_argument("--output")
+    parser.add_argument("--single-scale", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_scale:
+        args.users = int(args.users)
+        emit(run_single_scale(args))
+        return
+
+    results = run_scales(
+        "benchmarks.bench_api",
+        [int(n) for n in args.users.split(",")],
+        [
+            "--outages", str(args.outages), "--requests", str(args.requests),
+            "--concurrency", args.concurrency, "--batch-points", str(args.batch_points),
+        ],
+    )
+    emit({"benchmark": "api", "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
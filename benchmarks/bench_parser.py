@@ -0,0 +1,110 @@
+"""
+Compares the BeautifulSoup parse the scraper used to do against the
+streaming parser in outage_parser.py, on the saved UEDCL fixture page
+scaled up to an increasing number of table rows.
+
+    python -m benchmarks.bench_parser [--rows 100,1000,10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from outage_parser import iter_outage_rows, text_chunks
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "uedcl_outage_alerts.html")
+
+
+def scaled_page(rows):
+    """The fixture page with its first table body repeated to `rows` rows."""
+    with open(FIXTURE, encoding="utf-8") as f:
+        page = f.read()
+
+    body = re.search(r"<tbody>(.*?)</tbody>", page, re.S)
+    templates = re.findall(r"<tr>.*?</tr>", body.group(1), re.S)
+    generated = []
+    for i in range(rows):
+        row = templates[i % len(templates)]
+        # Vary the district so the old dict-keyed parse only collapses the
+        # rows that really share a district.
+        generated.append(row.replace("</td>\n          <td>", f"</td>\n          <td>D{i // 3} ", 1))
+    return page[:body.start(1)] + "\n".join(generated) + page[body.end(1):]
+
+
+def soup_rows(html):
+    """The old scrape_data.parse_outage_table, keeping every row."""
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table")
+    rows = []
+    for row in table.find_all("tr"):
+        cells = row.find_all("td")
+        if len(cells) >= 4:
+            date_time_raw = cells[0].get_text(strip=True).split(" ")
+            if len(date_time_raw) >= 2:
+                rows.append({
+                    "area": cells[1].get_text(strip=True),
+                    "status": cells[2].get_text(strip=True),
+                    "sub_areas": cells[3].get_text(strip=True),
+                    "date": date_time_raw[0],
+                    "time": date_time_raw[1],
+                })
+    return rows
+
+
+def streaming_rows(html):
+    return list(iter_outage_rows(text_chunks(html)))
+
+
+def measure(fn, html, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(html)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for rows in [int(n) for n in args.rows.split(",")]:
+        html = scaled_page(rows)
+        expected = soup_rows(html)
+        assert streaming_rows(html) == expected and len(expected) == rows
+
+        soup = measure(soup_rows, html, args.repeat)
+        streaming = measure(streaming_rows, html, args.repeat)
+        results.append({
+            "rows": rows,
+            "page_kib": round(len(html.encode("utf-8")) / 1024, 1),
+            "districts": len({row["area"] for row in expected}),
+            "beautifulsoup": soup,
+            "streaming": streaming,
+            "speedup": round(soup["median_ms"] / streaming["median_ms"], 2),
+            "peak_ratio": round(soup["peak_kib"] / streaming["peak_kib"], 2),
+        })
+
+    print(json.dumps({"benchmark": "outage_parser", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Times run_full_outage_pipeline end to end, with the ScrapeOps proxy, the
+geocoder, SMTP and the SMS provider replaced by local stubs, against SQLite seeded with
+synthetic users. Each scale runs four passes:
+
+    initial         empty outages table: insert, geocode, match, deliver
+    unchanged       same page again; should short-circuit after parsing
+    status_change   every row's status changes; updates only, no new alerts
+    new_outages     10% more rows; inserts and alerts for those only
+
+New outages wait for their sub-areas to be geocoded before they are
+matched, so a pass that links new sub-areas geocodes them all (as the
+worker's sub-area job would) and runs the pipeline once more to match and
+deliver.
+
+    python -m benchmarks.bench_pipeline [--users 1000,100000,1000000] [--rows 400]
+                                        [--districts 120] [--radii 5,20,50]
+                                        [--phones 0.3] [--output pipeline.json]
+
+--radii gives users a random alert radius from the list instead of the default.
+--phones gives that share of users a phone number, so they are also alerted
+by SMS.
+"""
+import argparse
+import os
+import time
+
+from benchmarks.harness import emit, run_scales, seed_users
+from benchmarks.stubs import StubGeocoder, StubPageServer, StubSMSServer, StubSMTP, outage_page
+
+STAGES = ("fetch", "parse", "geocode", "persist", "geocode_sub_areas", "match", "deliver")
+
+
+def run_single_scale(args):
+    stub = StubPageServer(outage_page(args.rows, args.districts))
+    sms = StubSMSServer()
+    # scrape_data and notifiers read these at import time.
+    os.environ["SCRAPE_PROXY_ENDPOINT"] = stub.url
+    os.environ["UEDCL_OUTAGE_URLS"] = "https://www.uedcl.co.ug/outage-alerts/"
+    os.environ["SMS_PROVIDER_URL"] = sms.url
+    os.environ.setdefault("SMS_RATE_PER_SECOND", "0")
+
+    import db
+    import delivery
+    import geocoding
+    from metrics import PIPELINE_STAGE_SECONDS
+    from scrape_data import run_full_outage_pipeline
+    from sub_areas import geocode_pending_sub_areas
+
+    geocoder = StubGeocoder()
+    geocoding.geolocator = geocoder
+    geocoding.GEOCODE_MIN_INTERVAL = 0
+    delivery.smtplib.SMTP = StubSMTP
+
+    started = time.perf_counter()
+    db.init_db()
+    radii = [float(r) for r in args.radii.split(",")] if args.radii else ()
+    seed_users(db.engine, args.users, args.subscribed, radii_km=radii, phone_ratio=args.phones)
+    seed_seconds = time.perf_counter() - started
+
+    grown_page = outage_page(args.rows + args.rows // 10, args.districts, status="Ongoing")
+    passes = [
+        ("initial", outage_page(args.rows, args.districts)),
+        ("unchanged", outage_page(args.rows, args.districts)),
+        ("status_change", outage_page(args.rows, args.districts, status="Ongoing")),
+        ("new_outages", grown_page),
+    ]
+
+    def geocode_all_sub_areas():
+        geocoded = 0
+        with db.SessionLocal() as session:
+            while True:
+                looked_up, _ = geocode_pending_sub_areas(session)
+                if not looked_up:
+                    return geocoded
+                geocoded += looked_up
+
+    runs = []
+    for name, page in passes:
+        stub.page = page
+        before = {stage: PIPELINE_STAGE_SECONDS.totals(stage=stage)[1] for stage in STAGES}
+        geocode_calls, messages = geocoder.calls, StubSMTP.messages
+        sms_messages, sms_requests = sms.messages, sms.requests
+
+        started = time.perf_counter()
+        pipeline_runs = 1
+        run_full_outage_pipeline(db.SessionLocal, "bench@bench.invalid", "secret", "localhost", 587)
+        if geocode_all_sub_areas():
+            pipeline_runs += 1
+            run_full_outage_pipeline(db.SessionLocal, "bench@bench.invalid", "secret", "localhost", 587)
+        elapsed = time.perf_counter() - started
+
+        runs.append({
+            "pass": name,
+            "seconds": round(elapsed, 3),
+            "pipeline_runs": pipeline_runs,
+            "stages_seconds": {
+                stage: round(PIPELINE_STAGE_SECONDS.totals(stage=stage)[1] - before[stage], 3)
+                for stage in STAGES
+            },
+            "geocode_calls": geocoder.calls - geocode_calls,
+            "emails": StubSMTP.messages - messages,
+            "sms": sms.messages - sms_messages,
+            "sms_requests": sms.requests - sms_requests,
+        })
+
+    stub.close()
+    sms.close()
+    return {
+        "users": args.users,
+        "subscribed_ratio": args.subscribed,
+        "rows": args.rows,
+        "districts": args.districts,
+        "radii_km": args.radii,
+        "phone_ratio": args.phones,
+        "seed_seconds": round(seed_seconds, 2),
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1000,100000,1000000")
+    parser.add_argument("--subscribed", type=float, default=0.5)
+    parser.add_argument("--rows", type=int, default=400)
+    parser.add_argument("--districts", type=int, default=120)
+    parser.add_argument("--radii", default="")
+    parser.add_argument("--phones", type=float, default=0.0)
+    parser.add_argument("--output")
+    parser.add_argument("--single-scale", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_scale:
+        args.users = int(args.users)
+        emit(run_single_scale(args))
+        return
+
+    results = run_scales(
+        "benchmarks.bench_pipeline",
+        [int(n) for n in args.users.split(",")],
+        [
+            "--subscribed", str(args.subscribed), "--rows", str(args.rows), "--districts", str(args.districts),
+            "--radii", args.radii, "--phones", str(args.phones),
+        ],
+    )
+    emit({"benchmark": "pipeline", "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compares the ORM read path the API used to take against the column-only
+read layer in read_models.py.
+
+    python -m benchmarks.bench_read_path [--rows 1000,10000,50000] [--repeat 20]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, time as dtime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Outage
+from read_models import fetch_active_outages, serialize_outage_list
+
+
+def seed(engine, rows):
+    random.seed(rows)
+    start = date(2025, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(Outage), [
+            {
+                "area": f"District {i}",
+                "sub_areas": ",".join(f"Village {i}-{j}" for j in range(5)),
+                "outage_date": start + timedelta(days=i % 30),
+                "outage_time": dtime(8 + i % 10, 0),
+                "latitude": random.uniform(-1.5, 4.0),
+                "longitude": random.uniform(29.5, 35.0),
+                "natural_key": f"bench-{i}",
+            }
+            for i in range(rows)
+        ])
+
+
+def orm_path(Session):
+    with Session() as db_session:
+        outages = db_session.query(Outage).filter(Outage.retired_at.is_(None)).all()
+        return [
+            {
+                "id": outage.id,
+                "area": outage.area,
+                "sub_areas": outage.sub_areas.split(",") if outage.sub_areas else [],
+                "date": outage.outage_date.isoformat() if outage.outage_date else None,
+                "time": outage.outage_time.isoformat() if outage.outage_time else None,
+            }
+            for outage in outages
+        ]
+
+
+def projected_path(engine):
+    with engine.connect() as connection:
+        return serialize_outage_list(fetch_active_outages(connection))
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(min(samples), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000,10000,50000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    for rows in [int(n) for n in args.rows.split(",")]:
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        seed(engine, rows)
+        Session = sessionmaker(bind=engine)
+
+        assert orm_path(Session) == projected_path(engine)
+
+        orm = timed(lambda: orm_path(Session), args.repeat)
+        projected = timed(lambda: projected_path(engine), args.repeat)
+        results.append({
+            "rows": rows,
+            "orm": orm,
+            "projected": projected,
+            "speedup": round(orm["median_ms"] / projected["median_ms"], 2),
+        })
+        engine.dispose()
+
+    print(json.dumps({"benchmark": "read_path", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Shared helpers for the benchmarks that need a seeded database.
+
+app.py, db.py and scrape_data.py read their configuration at import time,
+so every scale runs in a fresh interpreter (run_isolated) pointed at its own
+SQLite file.
+"""
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import date, time as dtime, timedelta
+
+from sqlalchemy import insert
+
+# Rough bounding box of Uganda; synthetic points fall inside it.
+MIN_LAT, MAX_LAT = -1.5, 4.0
+MIN_LON, MAX_LON = 29.5, 35.0
+
+SEED_CHUNK_SIZE = 20000
+
+
+def random_point(rng):
+    return rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LON, MAX_LON)
+
+
+def seed_users(engine, count, subscribed_ratio=0.5, seed=0, radii_km=(), phone_ratio=0.0):
+    """
+    Bulk inserts count located users, a share of them subscribed and a
+    phone_ratio share with a phone number. Each gets an alert radius drawn
+    from radii_km, or the site default when empty.
+    """
+    from models import User
+
+    rng = random.Random(seed)
+    with engine.begin() as connection:
+        for start in range(0, count, SEED_CHUNK_SIZE):
+            rows = []
+            for i in range(start, min(start + SEED_CHUNK_SIZE, count)):
+                lat, lon = random_point(rng)
+                rows.append({
+                    "email": f"user{i}@bench.invalid",
+                    "is_subscribed": rng.random() < subscribed_ratio,
+                    "latitude": lat,
+                    "longitude": lon,
+                    "alert_radius_km": rng.choice(radii_km) if radii_km else None,
+                    "phone_number": f"+2567{i:08d}" if phone_ratio and rng.random() < phone_ratio else None,
+                })
+            connection.execute(insert(User), rows)
+
+
+def seed_outages(engine, count, seed=0):
+    """Bulk inserts count active, geocoded outages."""
+    from models import Outage
+
+    rng = random.Random(seed)
+    start_date = date(2025, 1, 1)
+    with engine.begin() as connection:
+        for start in range(0, count, SEED_CHUNK_SIZE):
+            rows = []
+            for i in range(start, min(start + SEED_CHUNK_SIZE, count)):
+                lat, lon = random_point(rng)
+                rows.append({
+                    "area": f"District {i}",
+                    "sub_areas": ", ".join(f"Village {i}-{j}" for j in range(4)),
+                    "outage_date": start_date + timedelta(days=i % 30),
+                    "outage_time": dtime(8 + i % 10, 0),
+                    "status": "Scheduled",
+                    "latitude": lat,
+                    "longitude": lon,
+                    "natural_key": f"bench-{i}",
+                })
+            connection.execute(insert(Outage), rows)
+
+
+def summarize(samples_ms, elapsed_seconds=None):
+    """Latency percentiles in ms, plus throughput when elapsed_seconds is given."""
+    ordered = sorted(samples_ms)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    summary = {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(percentile(50), 3),
+        "p95_ms": round(percentile(95), 3),
+        "p99_ms": round(percentile(99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+    if elapsed_seconds:
+        summary["throughput_rps"] = round(len(ordered) / elapsed_seconds, 1)
+    return summary
+
+
+def temporary_database_url(directory):
+    return f"sqlite:///{os.path.join(directory, 'bench.db')}"
+
+
+def run_isolated(module, args, env=None):
+    """Runs `python -m module args` in a fresh interpreter and returns its JSON output."""
+    output = subprocess.run(
+        [sys.executable, "-m", module, *args],
+        env={**os.environ, **(env or {})},
+        check=True,
+        stdout=subprocess.PIPE,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout
+    return json.loads(output)
+
+
+def run_scales(module, scales, args, env=None):
+    """run_isolated once per user scale, each against a throwaway SQLite file."""
+    results = []
+    for users in scales:
+        with tempfile.TemporaryDirectory(prefix="outage-bench-") as directory:
+            results.append(run_isolated(
+                module,
+                ["--single-scale", "--users", str(users), *args],
+                {"DATABASE_URL": temporary_database_url(directory), **(env or {})},
+            ))
+    return results
+
+
+def emit(report, output=None):
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
@@ -0,0 +1,194 @@
+"""
+Local stand-ins for the pipeline's external services: the ScrapeOps proxy
+serving the UEDCL page, the Nominatim geocoder, the SMTP server and the bulk SMS provider.
+"""
+import hashlib
+import json
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from benchmarks.harness import MAX_LAT, MAX_LON, MIN_LAT, MIN_LON
+
+
+def outage_page(rows, districts=None, status="Scheduled"):
+    """A UEDCL-style outage page with `rows` table rows over `districts` districts."""
+    districts = districts or max(1, rows // 2)
+    start = date(2025, 1, 6)
+    body = []
+    for i in range(rows):
+        body.append(
+            "<tr>"
+            f"<td>{(start + timedelta(days=i % 14)).isoformat()} {8 + i % 10:02d}:00</td>"
+            f"<td>District {i % districts}</td>"
+            f"<td><span class=\"badge\">{status}</span></td>"
+            f"<td>Village {i}-a, Village {i}-b, Village {i}-c</td>"
+            "</tr>"
+        )
+    return (
+        "<html><head><title>Outage Alerts | UEDCL</title></head><body><main>"
+        "<table class=\"outage-table\"><thead><tr><th>Date &amp; Time</th><th>District</th>"
+        "<th>Status</th><th>Affected Areas</th></tr></thead><tbody>"
+        + "".join(body)
+        + "</tbody></table></main></body></html>"
+    )
+
+
+class StubPageServer:
+    """
+    Serves self.page for any GET, like the ScrapeOps proxy would. Statuses
+    queued in self.statuses are answered first, one per request, with an
+    empty body.
+    """
+
+    def __init__(self, page=""):
+        self.page = page
+        self.hits = 0
+        self.statuses = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                if stub.statuses:
+                    self.send_response(stub.statuses.pop(0))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = stub.page.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/v1/"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubSMSServer:
+    """
+    A bulk SMS endpoint. Every message is "sent" unless statuses maps its id
+    to another status, or to None to leave it out of the reply. With
+    error_status set, every request is answered with that HTTP status.
+    Counts requests and messages and records each batch's size.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.messages = 0
+        self.batch_sizes = []
+        self.statuses = {}
+        self.error_status = None
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                batch = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.requests += 1
+                    stub.messages += len(batch["messages"])
+                    stub.batch_sizes.append(len(batch["messages"]))
+                if stub.error_status:
+                    self.send_response(stub.error_status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                results = []
+                for message in batch["messages"]:
+                    status = stub.statuses.get(message["id"], "sent")
+                    if status is not None:
+                        results.append({"id": message["id"], "status": status})
+                body = json.dumps({"results": results}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/v1/sms/batch"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubGeocoder:
+    """
+    Resolves any query to a stable point inside Uganda, without throttling.
+    "Sub area, District, Uganda" lands within about 15 km of the district.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    @staticmethod
+    def _point(name):
+        digest = hashlib.sha256(name.encode("utf-8")).digest()
+        lat = MIN_LAT + (MAX_LAT - MIN_LAT) * digest[0] / 255
+        lon = MIN_LON + (MAX_LON - MIN_LON) * digest[1] / 255
+        return lat, lon, digest
+
+    def geocode(self, query):
+        self.calls += 1
+        parts = [part.strip() for part in query.split(",")]
+        if len(parts) < 3:
+            lat, lon, _ = self._point(query)
+            return SimpleNamespace(latitude=lat, longitude=lon)
+
+        lat, lon, _ = self._point(", ".join(parts[1:]))
+        _, _, digest = self._point(query)
+        return SimpleNamespace(
+            latitude=lat + (digest[0] - 128) / 128 * 0.1,
+            longitude=lon + (digest[1] - 128) / 128 * 0.1,
+        )
+
+
+class StubSMTP:
+    """Accepts every message; replaces smtplib.SMTP for the delivery pool."""
+
+    lock = threading.Lock()
+    connections = 0
+    messages = 0
+
+    def __init__(self, host, port, timeout=None):
+        with StubSMTP.lock:
+            StubSMTP.connections += 1
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def sendmail(self, from_addr, to_addrs, message, mail_options=(), rcpt_options=()):
+        with StubSMTP.lock:
+            StubSMTP.messages += 1
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
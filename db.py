@@ -0,0 +1,113 @@
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DB_URL = os.getenv("DATABASE_URL")
+
+
+if DB_URL and DB_URL.startswith("postgres://"):
+    DB_URL = DB_URL.replace("postgres://", "postgresql://", 1)
+
+final_db_url = DB_URL or 'sqlite:///outages.db'
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+# Recycle before typical server / load balancer idle timeouts close the socket.
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+
+def make_engine(url):
+    if url.startswith("sqlite"):
+        # SQLite picks its own pool; in-memory databases must not be pooled.
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            # WAL lets the web app keep reading while the pipeline writes.
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.close()
+
+        return engine
+
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+engine = make_engine(final_db_url)
+
+SessionLocal = sessionmaker(bind=engine)
+
+
+def _app_context_id():
+    from flask.globals import app_ctx
+    return id(app_ctx._get_current_object())
+
+
+# One session per Flask app context (i.e. per request), removed on teardown.
+db_session = scoped_session(SessionLocal, scopefunc=_app_context_id)
+
+
+def init_app(app):
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        db_session.remove()
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create missing tables, columns and indexes."""
+        init_db()
+        print("Database schema is up to date.")
+
+
+def init_db(bind=engine):
+    """
+    Brings the schema up to date: creates missing tables, adds missing
+    nullable columns to existing tables, creates missing indexes and the
+    PostGIS / R-tree spatial indexes.
+    Run it explicitly (`flask --app app init-db` or `python db.py`) on
+    deploy, not from the web or worker processes.
+    """
+    from models import Base
+    from proximity import install_spatial_indexes
+
+    Base.metadata.create_all(bind)
+
+    with bind.begin() as connection:
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info("Added column %s.%s", table.name, column.name)
+
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+        install_spatial_indexes(connection)
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Database schema is up to date.")
@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+SMTP_MAX_ATTEMPTS = int(os.getenv("SMTP_MAX_ATTEMPTS", 3))
+SMTP_BACKOFF_SECONDS = float(os.getenv("SMTP_BACKOFF_SECONDS", 2))
+# Most providers drop a session after a few hundred messages; recycle before that.
+SMTP_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MESSAGES_PER_CONNECTION", 100))
+
+
+class SMTPConnectionPool:
+    """
+    A small pool of authenticated SMTP connections.
+
+    Connections are opened lazily (connect, STARTTLS, login) and reused for up
+    to messages_per_connection sends. A connection that raised is discarded
+    instead of being returned to the pool.
+    """
+
+    def __init__(self, server, port, username, password, size=SMTP_POOL_SIZE,
+                 messages_per_connection=SMTP_MESSAGES_PER_CONNECTION, timeout=30):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.messages_per_connection = messages_per_connection
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            connection.starttls()
+            connection.login(self.username, self.password)
+        except Exception:
+            self._close(connection)
+            raise
+        connection.sent_count = 0
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+
+            try:
+                yield connection
+            except Exception:
+                self._close(connection)
+                raise
+
+            connection.sent_count += 1
+            if connection.sent_count >= self.messages_per_connection:
+                self._close(connection)
+            else:
+                self._idle.put(connection)
+
+    def send(self, message):
+        with self.connection() as connection:
+            connection.sendmail(message.sender, [message.recipient], message.data, list(message.mail_options))
+
+    def close_all(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+def send_with_retry(pool, message, max_attempts=SMTP_MAX_ATTEMPTS, backoff=SMTP_BACKOFF_SECONDS, limiter=None):
+    """
+    Sends one message, retrying with exponential backoff and jitter. Each
+    attempt first takes a token from limiter, if given. Returns True on success.
+    """
+    for attempt in range(max_attempts):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            pool.send(message)
+            return True
+        except smtplib.SMTPRecipientsRefused as e:
+            # Retrying a rejected address only burns quota.
+            logger.error("Recipient refused for %s: %s", message.recipient, e)
+            return False
+        except smtplib.SMTPNotSupportedError as e:
+            # Raised before anything is sent, e.g. SMTPUTF8 on a server without it.
+            logger.error("Server cannot deliver to %s: %s", message.recipient, e)
+            return False
+        except Exception as e:
+            logger.warning("Attempt %d: could not send email to %s: %s", attempt + 1, message.recipient, e)
+            if attempt < max_attempts - 1:
+                time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+
+    logger.error("Giving up on %s after %d attempts.", message.recipient, max_attempts)
+    return False
+
+
+def deliver_messages(pool, jobs, max_workers=SMTP_POOL_SIZE, max_attempts=SMTP_MAX_ATTEMPTS, limiter=None):
+    """
+    Sends (key, emails.RenderedEmail) jobs concurrently over the pool, at
+    the rate limiter (a notifiers.RateLimiter) allows.
+
+    Yields (key, sent_ok) in completion order so the caller can record
+    deliveries as they happen.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="smtp") as executor:
+        futures = {
+            executor.submit(send_with_retry, pool, message, max_attempts, limiter=limiter): key
+            for key, message in jobs
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,135 @@
+from collections import OrderedDict, namedtuple
+from email.message import EmailMessage
+from email.policy import SMTP
+from email.utils import formatdate, make_msgid
+from functools import lru_cache
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+from metrics import EMAIL_BODIES
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+EMAIL_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "emails")
+# Distinct alert bodies and outage list items kept rendered per process.
+EMAIL_BODY_CACHE_SIZE = int(os.getenv("EMAIL_BODY_CACHE_SIZE", 2048))
+EMAIL_FRAGMENT_CACHE_SIZE = int(os.getenv("EMAIL_FRAGMENT_CACHE_SIZE", 20000))
+
+SUBJECT = '⚡ URGENT: Scheduled Power Outage Alert Near Your Location'
+PLAIN_TEXT = 'Your client does not support HTML emails. Please upgrade to view the alert.'
+
+# Templates are compiled once per process.
+_environment = Environment(
+    loader=FileSystemLoader(EMAIL_TEMPLATE_DIR),
+    autoescape=select_autoescape(["html"]),
+)
+_alert_template = _environment.get_template("outage_alert.html")
+_item_template = _environment.get_template("outage_item.html")
+
+# A ready-to-send message: data is the full RFC 5322 message as bytes, and
+# mail_options the MAIL FROM options it needs (SMTPUTF8 for non-ASCII addresses).
+RenderedEmail = namedtuple("RenderedEmail", "sender recipient data mail_options")
+
+
+class _LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+_fragments = _LRUCache(EMAIL_FRAGMENT_CACHE_SIZE)
+_bodies = _LRUCache(EMAIL_BODY_CACHE_SIZE)
+
+
+def _fragment_key(outage):
+    # Distances are shown to the kilometre, so neighbours share fragments and bodies.
+    return (outage["id"], outage["area"], outage["date"], outage["time"], int(round(outage["distance_km"])))
+
+
+def _render_fragment(key):
+    fragment = _fragments.get(key)
+    if fragment is None:
+        _, area, date, time, distance_km = key
+        fragment = Markup(_item_template.render(area=area, date=date, time=time, distance_km=distance_km))
+        _fragments.put(key, fragment)
+    return fragment
+
+
+def _render_body(outage_details, radius_km):
+    """
+    The MIME body (multipart/alternative headers and parts) as bytes,
+    rendered once per distinct alert set and radius.
+    """
+    keys = tuple(_fragment_key(outage) for outage in outage_details)
+    cache_key = (f"{radius_km:g}", keys)
+    body = _bodies.get(cache_key)
+    if body is not None:
+        EMAIL_BODIES.inc(cache="hit")
+        return body
+
+    html_content = _alert_template.render(
+        radius_km=cache_key[0],
+        outage_items=Markup("\n").join(_render_fragment(key) for key in keys),
+    )
+    message = EmailMessage(policy=SMTP)
+    message.set_content(PLAIN_TEXT)
+    message.add_alternative(html_content, subtype='html')
+    body = message.as_bytes()
+
+    _bodies.put(cache_key, body)
+    EMAIL_BODIES.inc(cache="miss")
+    return body
+
+
+@lru_cache(maxsize=16)
+def _sender_headers(sender):
+    headers = EmailMessage(policy=SMTP)
+    headers['Subject'] = SUBJECT
+    headers['From'] = sender
+    # as_bytes() ends the header block with a blank line; the body supplies its own.
+    return headers.as_bytes()[:-2]
+
+
+def _recipient_headers(recipient_email, sender_domain):
+    if "\r" in recipient_email or "\n" in recipient_email:
+        raise ValueError(f"Invalid recipient address: {recipient_email!r}")
+    # Non-ASCII addresses go out as raw UTF-8 (RFC 6532) with SMTPUTF8; an
+    # encoded-word is not allowed inside an address.
+    return (
+        f"To: {recipient_email}\r\n"
+        f"Date: {formatdate(usegmt=True)}\r\n"
+        f"Message-ID: {make_msgid(domain=sender_domain)}\r\n"
+    ).encode("utf-8")
+
+
+def render_outage_email(recipient_email, outage_details, SENDER_EMAIL, radius_km):
+    """
+    Renders an alert for one recipient. The body comes from the rendered
+    body cache, so only the To, Date and Message-ID headers are built per
+    message. Non-ASCII recipients need a server that supports SMTPUTF8.
+    """
+    data = (
+        _sender_headers(SENDER_EMAIL)
+        + _recipient_headers(recipient_email, SENDER_EMAIL.rpartition("@")[2] or "localhost")
+        + _render_body(outage_details, radius_km)
+    )
+    mail_options = () if recipient_email.isascii() else ("SMTPUTF8",)
+    return RenderedEmail(SENDER_EMAIL, recipient_email, data, mail_options)
+
@@ -0,0 +1,145 @@
+import aiohttp
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+FETCH_TIMEOUT_SECONDS = float(os.getenv("FETCH_TIMEOUT_SECONDS", 120))
+FETCH_CONNECT_TIMEOUT_SECONDS = float(os.getenv("FETCH_CONNECT_TIMEOUT_SECONDS", 15))
+FETCH_MAX_ATTEMPTS = int(os.getenv("FETCH_MAX_ATTEMPTS", 3))
+FETCH_BACKOFF_SECONDS = float(os.getenv("FETCH_BACKOFF_SECONDS", 2))
+FETCH_MAX_BACKOFF_SECONDS = float(os.getenv("FETCH_MAX_BACKOFF_SECONDS", 30))
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", 4))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 900))
+
+# Worth retrying: throttling and upstream/proxy failures.
+RETRYABLE_STATUSES = {403, 408, 425, 429, 500, 502, 503, 504, 520, 522, 524}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream after failure_threshold consecutive failures.
+
+    While open every call fails fast; after reset_seconds one trial call is
+    let through (half-open) and its outcome closes or re-opens the breaker.
+    Other calls keep failing fast while the trial is in flight. A trial that
+    never reports back (say it was cancelled) is given up on after another
+    reset_seconds.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open":
+                raise CircuitOpenError("circuit open, skipping upstream call")
+            if state == "half-open":
+                now = time.monotonic()
+                if self._trial_started_at is not None and now - self._trial_started_at < self.reset_seconds:
+                    raise CircuitOpenError("circuit half-open, trial call in flight")
+                self._trial_started_at = now
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_started_at = None
+
+
+# Shared across pipeline runs so a dead proxy is skipped instead of retried every run.
+scrape_breaker = CircuitBreaker()
+
+
+def backoff_delay(attempt, base=FETCH_BACKOFF_SECONDS, cap=FETCH_MAX_BACKOFF_SECONDS):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def fetch_text(session, url, params=None, headers=None, breaker=None,
+                     max_attempts=FETCH_MAX_ATTEMPTS):
+    """
+    GETs url on a shared ClientSession and returns the body, or None once
+    attempts run out or a non-retryable status comes back.
+    """
+    breaker = breaker or CircuitBreaker()
+
+    for attempt in range(max_attempts):
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            logger.warning("Fetch %s skipped: %s", url, e)
+            return None
+
+        try:
+            async with session.get(url, params=params, headers=headers) as response:
+                if response.status == 200:
+                    body = await response.text()
+                    breaker.record_success()
+                    return body
+
+                logger.warning("Attempt %d: %s failed with status %d", attempt + 1, url, response.status)
+                breaker.record_failure()
+                if response.status not in RETRYABLE_STATUSES:
+                    return None
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("Attempt %d: %s failed: %r", attempt + 1, url, e)
+            breaker.record_failure()
+
+        if attempt < max_attempts - 1:
+            await asyncio.sleep(backoff_delay(attempt))
+
+    return None
+
+
+async def fetch_all(requests, breaker=None, concurrency=FETCH_CONCURRENCY,
+                    timeout=FETCH_TIMEOUT_SECONDS, connect_timeout=FETCH_CONNECT_TIMEOUT_SECONDS):
+    """
+    Fetches (url, params, headers) requests concurrently over one keep-alive
+    connection pool. Returns bodies (or None) in request order.
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        return await asyncio.gather(*[
+            fetch_text(session, url, params=params, headers=headers, breaker=breaker)
+            for url, params, headers in requests
+        ])
+
+
+def fetch_pages(requests, breaker=None, **kwargs):
+    """Blocking wrapper around fetch_all for the scheduler thread."""
+    return asyncio.run(fetch_all(requests, breaker=breaker, **kwargs))
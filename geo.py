@@ -0,0 +1,265 @@
+import math
+import os
+import threading
+
+import numpy as np
+
+R = 6371
+KM_PER_DEGREE = 111.32
+
+# Cell edge in degrees (~28 km at the equator). A 20 km radius query touches
+# at most a 3x3 block of cells.
+GRID_CELL_DEG = 0.25
+
+# Alert radius for users who have not chosen one, and the range they may choose from.
+DEFAULT_ALERT_RADIUS_KM = float(os.getenv("DEFAULT_ALERT_RADIUS_KM", 20))
+MIN_ALERT_RADIUS_KM = 1
+MAX_ALERT_RADIUS_KM = 100
+
+# Upper bound on point x outage distances computed at once by nearby_many.
+MATRIX_CHUNK_CELLS = 2_000_000
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Calculates the great-circle distance between two points
+    on the surface of a sphere (Earth) using the Haversine formula.
+    Returns distance in kilometers.
+    """
+    # Convert degrees to radians
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    # Haversine formula components
+    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    distance = R * c
+    return distance
+
+
+def haversine_many(lat, lon, lats, lons):
+    """
+    Vectorised haversine from one point to N points.
+    Returns a float64 array of distances in kilometers.
+    """
+    lat_rad = np.radians(lat)
+    lats_rad = np.radians(np.asarray(lats, dtype=np.float64))
+
+    dlat = lats_rad - lat_rad
+    dlon = np.radians(np.asarray(lons, dtype=np.float64)) - np.radians(lon)
+
+    a = np.sin(dlat / 2)**2 + np.cos(lat_rad) * np.cos(lats_rad) * np.sin(dlon / 2)**2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_matrix(lats1, lons1, lats2, lons2):
+    """
+    Pairwise haversine between two point sets.
+    Returns an (len(lats1), len(lats2)) array of distances in kilometers.
+    """
+    lats1_rad = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lons1_rad = np.radians(np.asarray(lons1, dtype=np.float64))[:, None]
+    lats2_rad = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lons2_rad = np.radians(np.asarray(lons2, dtype=np.float64))[None, :]
+
+    dlat = lats2_rad - lats1_rad
+    dlon = lons2_rad - lons1_rad
+
+    a = np.sin(dlat / 2)**2 + np.cos(lats1_rad) * np.cos(lats2_rad) * np.sin(dlon / 2)**2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def nearby_many(point_lats, point_lons, radii_km, lats, lons, entries):
+    """
+    Matches many points against one outage set with vectorised haversine
+    passes, chunked so the distance matrix stays under MATRIX_CHUNK_CELLS.
+    The same entry object may appear at several coordinates; each point gets
+    it once, at its closest. Returns one list of (distance_km, entry) per
+    point, closest first.
+    """
+    point_lats = np.asarray(point_lats, dtype=np.float64)
+    point_lons = np.asarray(point_lons, dtype=np.float64)
+    radii_km = np.asarray(radii_km, dtype=np.float64)
+
+    results = [[] for _ in range(len(point_lats))]
+    if not len(entries) or not len(point_lats):
+        return results
+
+    chunk = max(1, MATRIX_CHUNK_CELLS // len(entries))
+    for start in range(0, len(point_lats), chunk):
+        stop = start + chunk
+        distances = haversine_matrix(point_lats[start:stop], point_lons[start:stop], lats, lons)
+        rows, cols = np.nonzero(distances <= radii_km[start:stop, None])
+        # Sorted by point, then by distance within each point.
+        order = np.lexsort((distances[rows, cols], rows))
+        seen_row, seen = None, set()
+        for row, col in zip(rows[order], cols[order]):
+            if row != seen_row:
+                seen_row, seen = row, set()
+            if id(entries[col]) in seen:
+                continue
+            seen.add(id(entries[col]))
+            results[start + row].append((float(distances[row, col]), entries[col]))
+
+    return results
+
+
+def grid_cell(lat, lon, cell_deg=GRID_CELL_DEG):
+    return (math.floor(lat / cell_deg), math.floor(lon / cell_deg))
+
+
+def cells_within(lat, lon, radius_km, cell_deg=GRID_CELL_DEG):
+    """
+    Returns every grid cell that overlaps the bounding box of a
+    radius_km circle around (lat, lon).
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    # Near the poles the longitude span blows up, just scan the whole band.
+    dlon = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+
+    min_row, min_col = grid_cell(lat - dlat, lon - dlon, cell_deg)
+    max_row, max_col = grid_cell(lat + dlat, lon + dlon, cell_deg)
+
+    return [
+        (row, col)
+        for row in range(min_row, max_row + 1)
+        for col in range(min_col, max_col + 1)
+    ]
+
+
+def outage_locations(outage, points=None):
+    """
+    Where an outage is matched: its geocoded sub-areas from points
+    ({outage_id: [(lat, lon) or None, ...]}, see sub_areas.outage_points),
+    plus the district centroid while any sub-area is unresolved (or when it
+    has none). Empty when nothing is known.
+    """
+    centroid = []
+    if outage.latitude is not None and outage.longitude is not None:
+        centroid = [(outage.latitude, outage.longitude)]
+
+    located = points.get(outage.id) if points else None
+    if not located:
+        return centroid
+    resolved = [point for point in located if point is not None]
+    if len(resolved) < len(located):
+        return resolved + centroid
+    return resolved
+
+
+def outage_entry(outage):
+    """The serialised form of an outage kept in the index and served by /api/check_outage."""
+    return {
+        "id": outage.id,
+        "latitude": outage.latitude,
+        "longitude": outage.longitude,
+        "area": outage.area,
+        "sub_areas": outage.sub_areas.split(', ') if outage.sub_areas else [],
+        "date": outage.outage_date.isoformat() if outage.outage_date else None,
+        "time": outage.outage_time.isoformat() if outage.outage_time else None,
+    }
+
+
+class OutageIndex:
+    """
+    In-memory grid index over outage coordinates. An outage is indexed at
+    each of its sub-area points (see outage_locations) and lookups return
+    it once, at its closest point.
+
+    Each entry keeps the already-serialised outage fields so a lookup never
+    has to touch the database. The whole grid is swapped in one assignment on
+    rebuild, so readers never see a half-built index.
+    """
+
+    def __init__(self, cell_deg=GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._grid = None
+        # Every indexed point as (lats, lons, entries), for nearby_many.
+        self._flat = None
+        # Data version the grid was built from, see versions.py.
+        self.version = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_built(self):
+        return self._grid is not None
+
+    def build(self, outages, points=None):
+        cells = {}
+        flat = []
+        for outage in outages:
+            locations = outage_locations(outage, points)
+            if not locations:
+                continue
+
+            entry = outage_entry(outage)
+            for lat, lon in locations:
+                flat.append((lat, lon, entry))
+                cells.setdefault(grid_cell(lat, lon, self.cell_deg), []).append((lat, lon, entry))
+
+        def columns(located):
+            return (
+                np.array([lat for lat, _, _ in located], dtype=np.float64),
+                np.array([lon for _, lon, _ in located], dtype=np.float64),
+                [entry for _, _, entry in located],
+            )
+
+        self._flat = columns(flat)
+        # Per cell: (lats, lons, entries) so a lookup is one vectorised pass.
+        self._grid = {cell: columns(located) for cell, located in cells.items()}
+
+    def rebuild(self, connection, version=None):
+        """Reloads the index from the active outages through a Connection or Session."""
+        from read_models import fetch_active_outages
+        from sub_areas import outage_points
+
+        with self._lock:
+            self.build(fetch_active_outages(connection), outage_points(connection))
+            self.version = version
+
+    def nearby(self, lat, lon, radius_km):
+        """
+        Returns (distance_km, entry) pairs for every outage within radius_km,
+        closest first. Only points in the overlapping grid cells are measured.
+        """
+        grid = self._grid or {}
+        hits = [grid[cell] for cell in cells_within(lat, lon, radius_km, self.cell_deg) if cell in grid]
+        if not hits:
+            return []
+
+        if len(hits) == 1:
+            lats, lons, entries = hits[0]
+        else:
+            lats = np.concatenate([hit[0] for hit in hits])
+            lons = np.concatenate([hit[1] for hit in hits])
+            entries = [entry for hit in hits for entry in hit[2]]
+
+        distances = haversine_many(lat, lon, lats, lons)
+        close = np.flatnonzero(distances <= radius_km)
+        close = close[np.argsort(distances[close], kind="stable")]
+
+        matches = []
+        seen = set()
+        for i in close:
+            if id(entries[i]) not in seen:
+                seen.add(id(entries[i]))
+                matches.append((float(distances[i]), entries[i]))
+        return matches
+
+    def nearby_many(self, lats, lons, radii_km):
+        """
+        nearby() for many points at once: one vectorised pass over all
+        indexed outages instead of a grid lookup per point.
+        """
+        flat = self._flat or ((), (), [])
+        return nearby_many(lats, lons, radii_km, *flat)
+
+
+outage_index = OutageIndex()
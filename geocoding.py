@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from geopy.geocoders import Nominatim
+from models import GeocodeCache
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+GEOCODE_TTL = timedelta(days=int(os.getenv("GEOCODE_TTL_DAYS", 30)))
+GEOCODE_NEGATIVE_TTL = timedelta(hours=int(os.getenv("GEOCODE_NEGATIVE_TTL_HOURS", 24)))
+# Nominatim's usage policy allows at most one request per second.
+GEOCODE_MIN_INTERVAL = 1.0
+
+geolocator = Nominatim(user_agent="gregory_power_tracker_ug_contact_me_at_snowchildwolf@gmail.com")
+_last_request_at = 0.0
+# The worker runs the pipeline and the sub-area geocoder on separate threads.
+_throttle_lock = threading.Lock()
+
+
+def _is_fresh(entry, now):
+    ttl = GEOCODE_TTL if entry.resolved else GEOCODE_NEGATIVE_TTL
+    return entry.fetched_at + ttl > now
+
+
+def _throttled_geocode(query):
+    global _last_request_at
+
+    with _throttle_lock:
+        wait = _last_request_at + GEOCODE_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            return geolocator.geocode(query)
+        finally:
+            _last_request_at = time.monotonic()
+
+
+def geocode_area(session, area):
+    """
+    Resolves a district name to (lat, lon) through the geocode_cache table.
+
+    Fresh hits, including cached misses, return without a network call.
+    Expired entries are revalidated against Nominatim; if that request errors
+    the stale coordinates are still returned. New entries are added to the
+    session and persisted with the caller's commit.
+    Returns (None, None) when the name does not resolve.
+    """
+    return _cached_geocode(session, f"{area}, Uganda", area)
+
+
+def geocode_sub_area(session, name, district):
+    """geocode_area for a sub-area, qualified by its district."""
+    return _cached_geocode(session, f"{name}, {district}, Uganda", f"{name} ({district})")
+
+
+def _cached_geocode(session, query, label):
+    now = datetime.utcnow()
+    entry = session.get(GeocodeCache, query)
+
+    if entry is not None and _is_fresh(entry, now):
+        return entry.latitude, entry.longitude
+
+    try:
+        location = _throttled_geocode(query)
+    except Exception as e:
+        logger.warning("Geocoding error for %s: %s. Skipping coordinates.", label, e)
+        if entry is not None:
+            return entry.latitude, entry.longitude
+        return None, None
+
+    if entry is None:
+        entry = GeocodeCache(name=query)
+        session.add(entry)
+
+    entry.resolved = location is not None
+    entry.latitude = location.latitude if location else None
+    entry.longitude = location.longitude if location else None
+    entry.fetched_at = now
+
+    if location:
+        logger.info("Geocoded %r: (%s, %s)", label, entry.latitude, entry.longitude)
+    else:
+        logger.info("Could not geocode %r, caching the miss.", label)
+
+    return entry.latitude, entry.longitude
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from models import JobLock
+import os
+import socket
+import uuid
+
+
+def new_owner_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def tick_start(now, interval):
+    """Floors now to the start of its interval-sized tick, counted from the epoch."""
+    epoch = datetime(1970, 1, 1)
+    ticks = (now - epoch) // interval
+    return epoch + ticks * interval
+
+
+def acquire_tick(session, name, tick, owner, lease_seconds):
+    """
+    Takes the named lock for one schedule tick.
+
+    Succeeds only if no other owner holds an unexpired lease and no run has
+    completed for this tick yet, so however many processes race for the same
+    tick exactly one of them wins. Commits and returns True on success.
+    """
+    if session.get(JobLock, name) is None:
+        try:
+            session.add(JobLock(name=name))
+            session.commit()
+        except IntegrityError:
+            # Another process created it first.
+            session.rollback()
+
+    now = datetime.utcnow()
+    result = session.execute(
+        update(JobLock)
+        .where(JobLock.name == name)
+        .where(or_(JobLock.locked_until.is_(None), JobLock.locked_until < now))
+        .where(or_(JobLock.last_tick.is_(None), JobLock.last_tick < tick))
+        .values(owner=owner, locked_until=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def release_tick(session, name, tick, owner):
+    """Releases the lock and marks tick as done, if owner still holds it."""
+    session.execute(
+        update(JobLock)
+        .where(JobLock.name == name, JobLock.owner == owner)
+        .values(owner=None, locked_until=None, last_tick=tick)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
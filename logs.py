@@ -0,0 +1,10 @@
+import logging
+import os
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Root logger setup for the web, pipeline and outbox entry points."""
+    logging.basicConfig(level=level, format=LOG_FORMAT)
@@ -0,0 +1,98 @@
+from bisect import bisect_left
+
+import numpy as np
+
+from geo import cells_within, grid_cell, haversine_many, haversine_matrix, outage_locations
+from models import Notification
+
+# Users are searched in groups whose radius rounds up to one of these, so a
+# search never reaches more than 2.5x further than its users asked for.
+RADIUS_TIERS_KM = (2, 5, 10, 20, 50, 100)
+
+
+def load_notified_pairs(session, outage_ids):
+    """
+    Loads every (user_id, outage_id) pair already notified for the given
+    outages in a single query.
+    """
+    outage_ids = list(outage_ids)
+    if not outage_ids:
+        return set()
+
+    rows = session.query(Notification.user_id, Notification.outage_id).filter(
+        Notification.outage_id.in_(outage_ids)
+    )
+    return {(user_id, outage_id) for user_id, outage_id in rows}
+
+
+def alert_radius(user, default_radius_km):
+    """The user's chosen alert radius, or default_radius_km when they have not picked one."""
+    return user.alert_radius_km or default_radius_km
+
+
+def radius_tier(radius_km):
+    """The smallest tier in RADIUS_TIERS_KM that covers radius_km."""
+    index = bisect_left(RADIUS_TIERS_KM, radius_km)
+    return RADIUS_TIERS_KM[index] if index < len(RADIUS_TIERS_KM) else radius_km
+
+
+def match_users_to_outages(users, outages, default_radius_km, notified_pairs=frozenset(), points=None):
+    """
+    Matches users to outages within each user's alert radius (see
+    alert_radius), measured to the outage's closest point: its geocoded
+    sub-areas from points, else its district centroid (see
+    geo.outage_locations).
+
+    Users are grouped by radius tier, and each tier is bucketed into the
+    same grid as the outage index. An outage only measures the users in
+    the cells that the tier's radius reaches around its points, so a 5 km
+    city user is never pulled in by the 50 km search for rural users, and
+    every candidate is measured against all of the outage's points in one
+    pass. Pairs in notified_pairs are skipped. Returns a list of (user,
+    [(outage, distance_km), ...]) in the order the users were given,
+    leaving out users with no alerts.
+    """
+    located = [(outage, outage_locations(outage, points)) for outage in outages]
+    located = [(outage, locations) for outage, locations in located if locations]
+    if not users or not located:
+        return []
+
+    user_lats = np.array([user.latitude for user in users], dtype=np.float64)
+    user_lons = np.array([user.longitude for user in users], dtype=np.float64)
+    user_radii = np.array([alert_radius(user, default_radius_km) for user in users], dtype=np.float64)
+
+    tiers = {}
+    for row, (lat, lon, radius) in enumerate(zip(user_lats, user_lons, user_radii)):
+        buckets = tiers.setdefault(radius_tier(radius), {})
+        buckets.setdefault(grid_cell(lat, lon), []).append(row)
+    tiers = {
+        tier: {cell: np.array(rows, dtype=np.intp) for cell, rows in buckets.items()}
+        for tier, buckets in tiers.items()
+    }
+
+    alerts = {}
+    for outage, locations in located:
+        candidates = []
+        for tier, buckets in tiers.items():
+            # Sub-areas of one outage mostly share cells; visit each cell once.
+            cells = {cell for lat, lon in locations for cell in cells_within(lat, lon, tier)}
+            candidates.extend(buckets[cell] for cell in cells if cell in buckets)
+        if not candidates:
+            continue
+
+        rows = np.concatenate(candidates)
+        if len(locations) == 1:
+            lat, lon = locations[0]
+            distances = haversine_many(lat, lon, user_lats[rows], user_lons[rows])
+        else:
+            distances = haversine_matrix(
+                [lat for lat, _ in locations], [lon for _, lon in locations], user_lats[rows], user_lons[rows]
+            ).min(axis=0)
+        close = distances <= user_radii[rows]
+
+        for row, distance in zip(rows[close].tolist(), distances[close].tolist()):
+            if (users[row].id, outage.id) in notified_pairs:
+                continue
+            alerts.setdefault(row, []).append((outage, distance))
+
+    return [(users[row], alerts[row]) for row in sorted(alerts)]
@@ -0,0 +1,220 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import os
+import threading
+import time
+
+# Port for serve_metrics in the worker processes; unset disables it.
+METRICS_PORT = os.getenv("METRICS_PORT")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Pipeline stages take seconds to minutes, requests milliseconds.
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing count per label set, Prometheus style."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def totals(self, **labels):
+        """(count, sum) observed so far for one label set."""
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ((), 0.0))
+            return sum(counts), total
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+PIPELINE_RUNS = Counter(
+    "outage_pipeline_runs_total", "Pipeline runs by outcome.", ["result"]
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    "outage_pipeline_stage_seconds", "Time spent in each pipeline stage per run.", ["stage"], STAGE_BUCKETS
+)
+PIPELINE_STAGE_ITEMS = Counter(
+    "outage_pipeline_stage_items_total", "Items handled by each pipeline stage.", ["stage"]
+)
+PIPELINE_STAGE_FAILURES = Counter(
+    "outage_pipeline_stage_failures_total", "Pipeline stage failures.", ["stage"]
+)
+EMAIL_BODIES = Counter(
+    "outage_email_bodies_total", "Alert email bodies served from the rendered cache (hit) or rendered (miss).", ["cache"]
+)
+NOTIFICATIONS = Counter(
+    "outage_notifications_total", "Outbox messages delivered (sent) or not (failed), per channel.", ["channel", "result"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency per route.", ["route", "method"]
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Requests per route and status code.", ["route", "method", "status"]
+)
+
+
+class _StageRun:
+    def __init__(self):
+        self.items = 0
+        self.failed = False
+
+    def add(self, count=1):
+        self.items += count
+
+    def fail(self):
+        """Marks the stage failed without raising, e.g. when it returns no data."""
+        self.failed = True
+
+
+@contextmanager
+def pipeline_stage(stage):
+    """
+    Times one pipeline stage. The block can report how many items it handled
+    with .add(n); an exception or .fail() counts as a stage failure.
+    """
+    run = _StageRun()
+    started = time.perf_counter()
+    try:
+        yield run
+    except Exception:
+        run.failed = True
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - started, run.items, run.failed)
+
+
+def record_stage(stage, seconds, items=0, failed=False):
+    PIPELINE_STAGE_SECONDS.observe(seconds, stage=stage)
+    if items:
+        PIPELINE_STAGE_ITEMS.inc(items, stage=stage)
+    if failed:
+        PIPELINE_STAGE_FAILURES.inc(stage=stage)
+
+
+def init_app(app):
+    """
+    Records latency and status per route and serves /metrics. Each web
+    worker process keeps its own counters, so scrape every worker (or run
+    a single one).
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method)
+            HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return app.response_class(render(), content_type=CONTENT_TYPE)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serves render() on a daemon thread, for processes without a web app."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
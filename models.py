@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column ,Integer ,String,Date,Time,Float,DateTime,ForeignKey,Boolean
+from sqlalchemy import Column ,Integer ,String,Text,Date,Time,Float,DateTime,ForeignKey,Boolean,Index
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
 
@@ -8,28 +8,86 @@ Base = declarative_base()
 class Outage(Base):
     __tablename__ = "outages"
 
+    __table_args__ = (
+        Index("ix_outages_lat_lon", "latitude", "longitude"),
+    )
+
     id = Column(Integer,primary_key = True)
 
     area = Column(String,nullable = False)  
     sub_areas = Column(String,nullable=True)  
-    outage_date = Column(Date,nullable=False)
+    outage_date = Column(Date,nullable=False,index=True)
     outage_time = Column(Time,nullable=False)
     latitude = Column(Float,nullable=True)
     longitude = Column(Float,nullable=True)
+    status = Column(String,nullable=True)
+    # sha256 of area, date, time and sub areas; stable across pipeline runs.
+    natural_key = Column(String,nullable=True,unique=True,index=True)
+    # sha256 of the normalized scraped row, status included; see outage_sync.row_fingerprint.
+    row_hash = Column(String,nullable=True)
+    retired_at = Column(DateTime,nullable=True,index=True)
+    # When the scrape first listed it; NULL for outages synced before this column.
+    first_seen_at = Column(DateTime,nullable=True)
+    # When user_outage_matches was last filled for this outage; NULL means pending.
+    matched_at = Column(DateTime,nullable=True)
 
     def __repr__(self):
         return f"<Outage(area='{self.area}', date='{self.outage_date}')>"
 
+class SubArea(Base):
+    __tablename__ = "sub_areas"
+    __table_args__ = (
+        Index("ix_sub_areas_district_name", "district", "name", unique=True),
+    )
+
+    # One row per named place under a district, shared by every outage that lists it.
+    id = Column(Integer,primary_key=True)
+    district = Column(String,nullable=False)
+    name = Column(String,nullable=False)
+    latitude = Column(Float,nullable=True)
+    longitude = Column(Float,nullable=True)
+    # Set by the background geocoder (sub_areas.py); NULL means not looked up yet.
+    geocoded_at = Column(DateTime,nullable=True,index=True)
+
+    def __repr__(self):
+        return f"<SubArea(district='{self.district}', name='{self.name}')>"
+
+class OutageSubArea(Base):
+    __tablename__ = "outage_sub_areas"
+
+    outage_id = Column(Integer,ForeignKey("outages.id"),primary_key=True)
+    sub_area_id = Column(Integer,ForeignKey("sub_areas.id"),primary_key=True,index=True)
+
+    def __repr__(self):
+        return f"<OutageSubArea(outage_id={self.outage_id}, sub_area_id={self.sub_area_id})>"
+
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+
+    name = Column(String,primary_key=True)
+    latitude = Column(Float,nullable=True)
+    longitude = Column(Float,nullable=True)
+    resolved = Column(Boolean,nullable=False,default=False)
+    fetched_at = Column(DateTime,nullable=False,default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<GeocodeCache(name='{self.name}', resolved={self.resolved})>"
+
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index("ix_users_lat_lon", "latitude", "longitude"),
+    )
     
     id = Column(Integer,primary_key=True)
     name = Column(String,nullable=True)
     email= Column(String,nullable=False,unique=True)
     phone_number = Column(String,nullable=True)
-    is_subscribed = Column(Boolean,nullable=True,default=False)
+    is_subscribed = Column(Boolean,nullable=True,default=False,index=True)
     latitude = Column(Float,nullable=True)
     longitude = Column(Float,nullable=True)
+    # NULL means the site default, geo.DEFAULT_ALERT_RADIUS_KM.
+    alert_radius_km = Column(Float,nullable=True)
 
     def __repr__(self):
         return f"<User(email = '{self.email}', lat = '{self.latitude}')"
@@ -39,12 +97,87 @@ class Notification(Base):
     __tablename__ = "notifications"
 
     user_id = Column(Integer,ForeignKey('users.id'),primary_key=True)
-    outage_id = Column(Integer,ForeignKey("outages.id"),primary_key=True)
+    # The composite primary key leads with user_id, so outage lookups need their own index.
+    outage_id = Column(Integer,ForeignKey("outages.id"),primary_key=True,index=True)
     sent_at = Column(DateTime, default = datetime.utcnow)
+    # Digest mode: when the alert was held for the user's next digest; NULL
+    # once it has been queued in the outbox. See outbox.flush_digests.
+    held_at = Column(DateTime,nullable=True,index=True)
 
     def __repr__(self):
         return F"<Notification(user_id={self.user_id}, outage_id={self.outage_id})>"
 
+class UserOutageMatch(Base):
+    __tablename__ = "user_outage_matches"
+
+    # Every located user within the alert radius of an active outage, kept up
+    # to date by alert_matches.py so reads never redo the proximity work.
+    user_id = Column(Integer,ForeignKey('users.id'),primary_key=True)
+    outage_id = Column(Integer,ForeignKey("outages.id"),primary_key=True,index=True)
+    distance_km = Column(Float,nullable=False)
+    matched_at = Column(DateTime,nullable=False,default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<UserOutageMatch(user_id={self.user_id}, outage_id={self.outage_id})>"
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_claim", "status", "lease_expires_at"),
+    )
+
+    id = Column(Integer,primary_key=True)
+    user_id = Column(Integer,ForeignKey('users.id'),nullable=False)
+    # An email address, or a phone number for the sms channel.
+    recipient = Column(String,nullable=False)
+    channel = Column(String,nullable=True)  # email (or NULL, for older rows) | sms
+    # JSON: {"radius_km": ..., "outages": [{"id", "area", "distance_km", "date", "time"}, ...]}
+    payload = Column(Text,nullable=False)
+    status = Column(String,nullable=False,default="pending")  # pending | sent | failed
+    attempts = Column(Integer,nullable=False,default=0)
+    lease_owner = Column(String,nullable=True)
+    lease_expires_at = Column(DateTime,nullable=True)
+    last_error = Column(String,nullable=True)
+    created_at = Column(DateTime,nullable=False,default=datetime.utcnow)
+    sent_at = Column(DateTime,nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxMessage(id={self.id}, recipient='{self.recipient}', status='{self.status}')>"
+
+class JobLock(Base):
+    __tablename__ = "job_locks"
+
+    name = Column(String,primary_key=True)
+    owner = Column(String,nullable=True)
+    locked_until = Column(DateTime,nullable=True)
+    # Start of the last schedule tick that completed a run.
+    last_tick = Column(DateTime,nullable=True)
+
+    def __repr__(self):
+        return f"<JobLock(name='{self.name}', owner='{self.owner}')>"
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    name = Column(String,primary_key=True)
+    version = Column(Integer,nullable=False,default=0)
+    updated_at = Column(DateTime,nullable=False,default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DataVersion(name='{self.name}', version={self.version})>"
+
+class ScrapeFingerprint(Base):
+    __tablename__ = "scrape_fingerprints"
+
+    name = Column(String,primary_key=True)
+    # sha256 over the row fingerprints of the last scraped table.
+    digest = Column(String,nullable=False)
+    checked_at = Column(DateTime,nullable=False,default=datetime.utcnow)
+    changed_at = Column(DateTime,nullable=False,default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ScrapeFingerprint(name='{self.name}', changed_at='{self.changed_at}')>"
+
 
 # engine = create_engine('sqlite:///outages.db')
 
@@ -0,0 +1,224 @@
+"""
+Delivery channels for outbox messages. Each channel has a Notifier that
+turns claimed OutboxMessage rows into sends, with its own concurrency and
+rate limit, so a slow SMS provider never holds up email and vice versa.
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from delivery import SMTP_POOL_SIZE, SMTPConnectionPool, deliver_messages
+from emails import render_outage_email
+from requests.adapters import HTTPAdapter
+import logging
+import os
+import requests
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EMAIL = "email"
+SMS = "sms"
+
+# 0 disables the limit.
+EMAIL_RATE_PER_SECOND = float(os.getenv("EMAIL_RATE_PER_SECOND", 0))
+
+# Bulk SMS endpoint; unset disables the SMS channel. It takes
+# {"sender", "messages": [{"id", "to", "text"}, ...]} and answers
+# {"results": [{"id", "status"}, ...]} with status "sent" or an error.
+SMS_PROVIDER_URL = os.getenv("SMS_PROVIDER_URL")
+SMS_API_KEY = os.getenv("SMS_API_KEY", "")
+SMS_SENDER_ID = os.getenv("SMS_SENDER_ID", "PowerAlert")
+SMS_BATCH_SIZE = int(os.getenv("SMS_BATCH_SIZE", 100))
+SMS_CONCURRENCY = int(os.getenv("SMS_CONCURRENCY", 4))
+SMS_RATE_PER_SECOND = float(os.getenv("SMS_RATE_PER_SECOND", 50))
+SMS_TIMEOUT_SECONDS = float(os.getenv("SMS_TIMEOUT_SECONDS", 30))
+# Two concatenated segments.
+SMS_MAX_CHARS = 306
+
+
+class RateLimiter:
+    """Token bucket shared by a channel's sending threads; rate 0 means unlimited."""
+
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = rate_per_second
+        self.capacity = burst or max(1.0, rate_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Blocks until tokens are available. Requests above the burst size wait for a full bucket."""
+        if not self.rate:
+            return
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Notifier(ABC):
+    """Delivers outbox messages over one channel."""
+
+    channel = None
+    limiter = None
+
+    @abstractmethod
+    def deliver(self, messages):
+        """Takes [(OutboxMessage, payload dict), ...] and yields (message id, sent_ok)."""
+
+    def max_messages(self, seconds):
+        """How many messages the rate limit lets through in seconds, or None when unlimited."""
+        if self.limiter is None or not self.limiter.rate:
+            return None
+        return max(1, int(self.limiter.rate * seconds))
+
+    def close(self):
+        pass
+
+
+class EmailNotifier(Notifier):
+    """Rendered alert emails over the pooled SMTP connections, one send per message."""
+
+    channel = EMAIL
+
+    def __init__(self, sender_email, sender_password, smtp_server, smtp_port,
+                 max_workers=SMTP_POOL_SIZE, rate_per_second=EMAIL_RATE_PER_SECOND):
+        self.sender_email = sender_email
+        self.pool = SMTPConnectionPool(smtp_server, smtp_port, sender_email, sender_password, size=max_workers)
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate_per_second)
+
+    def deliver(self, messages):
+        jobs = [
+            (message.id, render_outage_email(
+                message.recipient, payload["outages"], self.sender_email, payload["radius_km"]
+            ))
+            for message, payload in messages
+        ]
+        yield from deliver_messages(self.pool, jobs, self.max_workers, limiter=self.limiter)
+
+    def close(self):
+        self.pool.close_all()
+
+
+def sms_text(payload):
+    """A short alert for one payload, cut to SMS_MAX_CHARS with a count of what did not fit."""
+    outages = payload["outages"]
+    text = "Power outage alert near you:"
+    for shown, outage in enumerate(outages):
+        item = f" {outage['area']} {outage['date']} {outage['time'][:5]} (~{max(1, round(outage['distance_km']))}km);"
+        remaining = len(outages) - shown - 1
+        more = f" +{remaining} more" if remaining else ""
+        if len(text) + len(item) + len(more) > SMS_MAX_CHARS:
+            return text.rstrip(";") + f" +{len(outages) - shown} more"
+        text += item
+    return text.rstrip(";")
+
+
+class SMSNotifier(Notifier):
+    """
+    Alerts through a bulk SMS HTTP API: up to batch_size messages per
+    request, max_workers requests in flight, rate_per_second messages per
+    second across them. A failed request fails its whole batch, and the
+    outbox retries those messages later.
+    """
+
+    channel = SMS
+
+    def __init__(self, url=SMS_PROVIDER_URL, api_key=SMS_API_KEY, sender_id=SMS_SENDER_ID,
+                 batch_size=SMS_BATCH_SIZE, max_workers=SMS_CONCURRENCY, rate_per_second=SMS_RATE_PER_SECOND,
+                 timeout=SMS_TIMEOUT_SECONDS):
+        self.url = url
+        self.sender_id = sender_id
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_per_second, burst=max(batch_size, rate_per_second))
+        self.http = requests.Session()
+        self.http.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=max_workers))
+        if api_key:
+            self.http.headers["Authorization"] = f"Bearer {api_key}"
+
+    def _send_batch(self, batch):
+        self.limiter.acquire(len(batch))
+        try:
+            response = self.http.post(
+                self.url,
+                json={
+                    "sender": self.sender_id,
+                    "messages": [{"id": message_id, "to": to, "text": text} for message_id, to, text in batch],
+                },
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            statuses = {result.get("id"): result.get("status") for result in response.json().get("results", [])}
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("SMS batch of %d failed: %s", len(batch), e)
+            return [(message_id, False) for message_id, _, _ in batch]
+
+        results = []
+        for message_id, to, _ in batch:
+            sent_ok = statuses.get(message_id) == "sent"
+            if not sent_ok:
+                logger.error("SMS to %s rejected: %s", to, statuses.get(message_id, "no result"))
+            results.append((message_id, sent_ok))
+        return results
+
+    def deliver(self, messages):
+        jobs = [(message.id, message.recipient, sms_text(payload)) for message, payload in messages]
+        batches = [jobs[start:start + self.batch_size] for start in range(0, len(jobs), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sms") as executor:
+            for future in as_completed([executor.submit(self._send_batch, batch) for batch in batches]):
+                yield from future.result()
+
+    def close(self):
+        self.http.close()
+
+
+def enabled_channels(phone_number):
+    """Channels a subscriber with this phone number is alerted on."""
+    if phone_number and SMS_PROVIDER_URL:
+        return (EMAIL, SMS)
+    return (EMAIL,)
+
+
+def build_notifiers(SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER, SMTP_PORT):
+    """One Notifier per configured channel, keyed by channel name."""
+    notifiers = {EMAIL: EmailNotifier(SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER, SMTP_PORT)}
+    if SMS_PROVIDER_URL:
+        notifiers[SMS] = SMSNotifier()
+    return notifiers
+
+
+def deliver_all(notifiers, messages):
+    """
+    Delivers [(OutboxMessage, payload), ...] with every channel running at
+    once. Returns [(message id, sent_ok), ...]; messages on a channel with
+    no notifier count as failed.
+    """
+    by_channel = {}
+    for message, payload in messages:
+        by_channel.setdefault(message.channel or EMAIL, []).append((message, payload))
+
+    results = []
+    for channel in set(by_channel) - set(notifiers):
+        logger.error("No notifier for channel %r; %d message(s) not sent.", channel, len(by_channel[channel]))
+        results.extend((message.id, False) for message, _ in by_channel.pop(channel))
+
+    if not by_channel:
+        return results
+    with ThreadPoolExecutor(max_workers=len(by_channel), thread_name_prefix="notify") as executor:
+        futures = [
+            executor.submit(lambda n, m: list(n.deliver(m)), notifiers[channel], channel_messages)
+            for channel, channel_messages in by_channel.items()
+        ]
+        for future in futures:
+            results.extend(future.result())
+    return results
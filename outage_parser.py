@@ -0,0 +1,124 @@
+from html.parser import HTMLParser
+
+
+PARSE_CHUNK_SIZE = 64 * 1024
+
+
+class OutageTableParser(HTMLParser):
+    """
+    Event-driven scan of the first <table> on the UEDCL page.
+
+    Only row and cell state is kept, never a document tree. Each <tr> with
+    at least four <td> cells becomes a record in self.rows; the caller
+    drains that list as it feeds chunks. Everything after the table is
+    ignored.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.found_table = False
+        self.done = False
+        self._table_depth = 0
+        self._cells = None
+        self._cell = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        self._flush_text()
+        if tag == "table":
+            self.found_table = True
+            self._table_depth += 1
+        elif self._table_depth == 0:
+            return
+        elif tag == "tr":
+            # </tr> is optional, so a new row closes the open one.
+            self._close_row()
+            self._cells = []
+        elif tag in ("thead", "tbody", "tfoot"):
+            self._close_row()
+        elif tag in ("td", "th") and self._cells is not None:
+            self._close_cell()
+            self._cell = [] if tag == "td" else None
+
+    def handle_endtag(self, tag):
+        if self.done or self._table_depth == 0:
+            return
+        self._flush_text()
+        if tag in ("td", "th"):
+            self._close_cell()
+        elif tag in ("tr", "thead", "tbody", "tfoot"):
+            self._close_row()
+        elif tag == "table":
+            self._table_depth -= 1
+            if self._table_depth == 0:
+                self._close_row()
+                self.done = True
+
+    def close(self):
+        super().close()
+        # A page cut off inside the table still yields its last row.
+        if self._table_depth and not self.done:
+            self._close_row()
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            # A text node can arrive in pieces when it spans two chunks.
+            self._text.append(data)
+
+    def _flush_text(self):
+        # Strip whole text nodes, same as BeautifulSoup's get_text(strip=True).
+        if self._text:
+            stripped = "".join(self._text).strip()
+            if stripped and self._cell is not None:
+                self._cell.append(stripped)
+            self._text = []
+
+    def _close_cell(self):
+        self._flush_text()
+        if self._cell is not None:
+            self._cells.append("".join(self._cell))
+        self._cell = None
+
+    def _close_row(self):
+        self._close_cell()
+        cells, self._cells = self._cells, None
+        if not cells or len(cells) < 4:
+            return
+
+        date_time_raw = cells[0].split(" ")
+        if len(date_time_raw) >= 2:
+            self.rows.append({
+                "area": cells[1],
+                "status": cells[2],
+                "sub_areas": cells[3],
+                "date": date_time_raw[0],
+                "time": date_time_raw[1],
+            })
+
+
+def iter_outage_rows(chunks, parser=None):
+    """
+    Yields outage records from an iterable of HTML text chunks as soon as
+    each row closes, keeping every row (several outages can share a
+    district). Stops reading once the first table ends.
+    """
+    parser = parser or OutageTableParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.rows:
+            yield from parser.rows
+            parser.rows = []
+        if parser.done:
+            break
+    else:
+        parser.close()
+        yield from parser.rows
+        parser.rows = []
+
+
+def text_chunks(text, size=PARSE_CHUNK_SIZE):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
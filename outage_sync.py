@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, or_, select, update
+from models import Outage, Notification, ScrapeFingerprint, UserOutageMatch
+from sub_areas import split_sub_areas, unlink_outages
+import hashlib
+import os
+
+
+# Retired outages (and their notification rows) are kept this long before purging.
+OUTAGE_RETENTION = timedelta(days=int(os.getenv("OUTAGE_RETENTION_DAYS", 14)))
+
+
+def _normalize(value):
+    return " ".join((value or "").split())
+
+
+def outage_natural_key(area, outage_date, outage_time, sub_areas):
+    """
+    Identity of a scraped outage. Whitespace is normalized and sub_areas is
+    taken as a set of names, so reflowing or reordering the affected-areas
+    cell does not make it a new outage.
+    """
+    names = ",".join(sorted(set(split_sub_areas(sub_areas))))
+    sub_areas_hash = hashlib.sha256(names.encode("utf-8")).hexdigest()
+    raw = f"{_normalize(area)}|{outage_date.isoformat()}|{outage_time.isoformat()}|{sub_areas_hash}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def row_fingerprint(row):
+    """sha256 of a scraped row with whitespace normalized, status included."""
+    raw = "|".join([
+        _normalize(row["area"]),
+        row["outage_date"].isoformat(),
+        row["outage_time"].isoformat(),
+        _normalize(row["sub_areas"]),
+        _normalize(row["status"]),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def table_fingerprint(scraped_rows):
+    """Order-insensitive sha256 over the row fingerprints of a whole scrape."""
+    row_hashes = sorted(row_fingerprint(row) for row in scraped_rows)
+    return hashlib.sha256("\n".join(row_hashes).encode("utf-8")).hexdigest()
+
+
+def scrape_unchanged(session, name, digest):
+    """
+    True if digest matches the last recorded scrape, in which case the check
+    time is updated. Nothing is committed.
+    """
+    fingerprint = session.get(ScrapeFingerprint, name)
+    if fingerprint is None or fingerprint.digest != digest:
+        return False
+    fingerprint.checked_at = datetime.utcnow()
+    return True
+
+
+def record_fingerprint(session, name, digest):
+    """
+    Stores digest as the last fully processed scrape. Commit it with the
+    last step of the run so a failed run is retried instead of skipped.
+    """
+    now = datetime.utcnow()
+    fingerprint = session.get(ScrapeFingerprint, name)
+    if fingerprint is None:
+        session.add(ScrapeFingerprint(name=name, digest=digest, checked_at=now, changed_at=now))
+    else:
+        fingerprint.digest = digest
+        fingerprint.checked_at = now
+        fingerprint.changed_at = now
+
+
+def sync_outages(session, scraped_rows, geocode):
+    """
+    Applies a scrape to the outages table incrementally.
+
+    scraped_rows are dicts with area, sub_areas, outage_date, outage_time and
+    status. Rows are keyed on outage_natural_key: unseen keys are geocoded and
+    bulk inserted, known keys whose row_fingerprint changed (or that had been
+    retired and reappeared) are bulk updated, and active outages missing from the
+    scrape are retired and lose their user_outage_matches rows. Retired
+    outages older than OUTAGE_RETENTION are purged together with their
+    notifications and sub-area links.
+
+    geocode(area) -> (lat, lon) is only called for new rows. Nothing is
+    committed. Returns (current_outages, stats) where current_outages are
+    the Outage objects present in this scrape.
+    """
+    now = datetime.utcnow()
+
+    scraped = {}
+    for row in scraped_rows:
+        key = outage_natural_key(row["area"], row["outage_date"], row["outage_time"], row["sub_areas"])
+        scraped[key] = (row, row_fingerprint(row))
+
+    existing = {
+        natural_key: (outage_id, row_hash, retired_at)
+        for outage_id, natural_key, row_hash, retired_at in session.execute(
+            select(Outage.id, Outage.natural_key, Outage.row_hash, Outage.retired_at)
+            .where(Outage.natural_key.in_(list(scraped)))
+        )
+    }
+
+    new_rows = []
+    changed_rows = []
+    for key, (row, row_hash) in scraped.items():
+        if key not in existing:
+            lat, lon = geocode(row["area"]) if row["area"] else (None, None)
+            new_rows.append({
+                **row, "natural_key": key, "row_hash": row_hash, "latitude": lat, "longitude": lon,
+                "first_seen_at": now,
+            })
+            continue
+
+        outage_id, stored_hash, retired_at = existing[key]
+        if stored_hash != row_hash or retired_at is not None:
+            changed_rows.append({
+                "id": outage_id, "status": row["status"], "row_hash": row_hash, "retired_at": None,
+            })
+
+    if new_rows:
+        session.execute(insert(Outage), new_rows)
+    if changed_rows:
+        session.execute(update(Outage), changed_rows)
+
+    retired = session.execute(
+        update(Outage)
+        .where(Outage.retired_at.is_(None))
+        .where(or_(Outage.natural_key.is_(None), Outage.natural_key.not_in(list(scraped))))
+        .values(retired_at=now, matched_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    # Retired outages drop out of the materialized matches; a reappearing
+    # one is matched again because its matched_at is NULL.
+    session.execute(
+        delete(UserOutageMatch)
+        .where(UserOutageMatch.outage_id.in_(select(Outage.id).where(Outage.retired_at.isnot(None))))
+        .execution_options(synchronize_session=False)
+    )
+
+    expired_ids = select(Outage.id).where(Outage.retired_at < now - OUTAGE_RETENTION)
+    unlink_outages(session, expired_ids)
+    session.execute(
+        delete(Notification)
+        .where(Notification.outage_id.in_(expired_ids))
+        .execution_options(synchronize_session=False)
+    )
+    purged = session.execute(
+        delete(Outage)
+        .where(Outage.retired_at < now - OUTAGE_RETENTION)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    current_outages = session.query(Outage).filter(Outage.natural_key.in_(list(scraped))).all()
+
+    stats = {
+        "inserted": len(new_rows),
+        "updated": len(changed_rows),
+        "retired": retired,
+        "purged": purged,
+    }
+    return current_outages, stats
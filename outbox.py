@@ -0,0 +1,340 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, or_, select, update
+from models import Notification, Outage, OutboxMessage, User, UserOutageMatch
+from matching import alert_radius
+from metrics import NOTIFICATIONS, record_stage
+from notifiers import EMAIL, build_notifiers, deliver_all, enabled_channels
+from proximity import SubscriberRow
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 300))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_RETRY_DELAY_SECONDS = int(os.getenv("OUTBOX_RETRY_DELAY_SECONDS", 600))
+OUTBOX_POLL_SECONDS = int(os.getenv("OUTBOX_POLL_SECONDS", 30))
+
+# immediate: one message per user per pipeline run that finds new alerts.
+# digest:    hold new alerts and send each user one message once the oldest
+#            has waited DIGEST_INTERVAL_MINUTES or DIGEST_MAX_ALERTS pile up.
+NOTIFICATION_MODE = os.getenv("NOTIFICATION_MODE", "immediate").lower()
+DIGEST_INTERVAL = timedelta(minutes=int(os.getenv("DIGEST_INTERVAL_MINUTES", 60)))
+DIGEST_MAX_ALERTS = int(os.getenv("DIGEST_MAX_ALERTS", 10))
+# Users flushed per query, to stay under database bound parameter limits.
+DIGEST_FLUSH_CHUNK = 500
+
+
+def new_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _add_message(session, user, user_alerts, default_radius_km):
+    """
+    Adds the outbox messages for (user, [(outage, distance_km), ...]): an
+    email, plus an SMS when the user has a phone number and SMS is
+    configured. Returns the outage ids.
+    """
+    outages = [
+        {
+            "id": outage.id,
+            "area": outage.area,
+            "distance_km": round(distance, 2),
+            "date": outage.outage_date.isoformat(),
+            "time": outage.outage_time.isoformat(),
+        }
+        for outage, distance in user_alerts
+    ]
+    payload = json.dumps({"radius_km": alert_radius(user, default_radius_km), "outages": outages})
+    for channel in enabled_channels(user.phone_number):
+        session.add(OutboxMessage(
+            user_id=user.id,
+            recipient=user.email if channel == EMAIL else user.phone_number,
+            channel=channel,
+            payload=payload,
+        ))
+    return [outage["id"] for outage in outages]
+
+
+def enqueue_alerts(session, matches, default_radius_km):
+    """
+    Queues the outbox messages for each (user, [(outage, distance_km), ...]) match,
+    quoting the user's alert radius (default_radius_km if unset), and
+    records the Notification rows for its outages in the same session, so
+    a commit either queues an alert and marks it as notified or does neither.
+    Returns the number of users alerted.
+    """
+    queued = 0
+    for user, user_alerts in matches:
+        session.add_all([
+            Notification(user_id=user.id, outage_id=outage_id)
+            for outage_id in _add_message(session, user, user_alerts, default_radius_km)
+        ])
+        queued += 1
+
+    return queued
+
+
+def hold_alerts(session, matches, now=None):
+    """
+    Digest mode counterpart of enqueue_alerts: records each match as a
+    Notification held for the user's next digest instead of queueing a
+    message. The Notification row still deduplicates, so a held alert is
+    never matched again. Returns the number of alerts held.
+    """
+    now = now or datetime.utcnow()
+    held = 0
+    for user, user_alerts in matches:
+        session.add_all([
+            Notification(user_id=user.id, outage_id=outage.id, sent_at=None, held_at=now)
+            for outage, _ in user_alerts
+        ])
+        held += len(user_alerts)
+    return held
+
+
+def flush_digests(session, default_radius_km, now=None, interval=DIGEST_INTERVAL,
+                  max_alerts=DIGEST_MAX_ALERTS, flush_all=False):
+    """
+    Queues a digest (see _add_message) for each user whose held alerts are due: the
+    oldest has waited interval, or max_alerts have piled up (every user with
+    held alerts when flush_all). Outages that ended, matches that went away
+    because the user moved, and unsubscribed users are dropped from the
+    digest. Nothing is committed. Returns the number of users alerted.
+    """
+    now = now or datetime.utcnow()
+    due = select(Notification.user_id).where(Notification.held_at.isnot(None)).group_by(Notification.user_id)
+    if not flush_all:
+        due = due.having(or_(func.min(Notification.held_at) <= now - interval, func.count() >= max_alerts))
+    due_user_ids = session.scalars(due).all()
+
+    queued = 0
+    for start in range(0, len(due_user_ids), DIGEST_FLUSH_CHUNK):
+        user_ids = due_user_ids[start:start + DIGEST_FLUSH_CHUNK]
+        rows = session.execute(
+            select(
+                User.id, User.email, User.latitude, User.longitude, User.alert_radius_km, User.phone_number,
+                User.is_subscribed,
+                Outage, UserOutageMatch.distance_km,
+            )
+            .select_from(Notification)
+            .join(User, User.id == Notification.user_id)
+            .join(Outage, Outage.id == Notification.outage_id)
+            .outerjoin(
+                UserOutageMatch,
+                (UserOutageMatch.user_id == Notification.user_id)
+                & (UserOutageMatch.outage_id == Notification.outage_id),
+            )
+            .where(Notification.held_at.isnot(None), Notification.user_id.in_(user_ids))
+            .order_by(User.id, UserOutageMatch.distance_km)
+        )
+
+        digests = {}
+        for user_id, email, lat, lon, radius_km, phone_number, is_subscribed, outage, distance in rows:
+            if not is_subscribed or outage.retired_at is not None or distance is None:
+                continue
+            user = SubscriberRow(user_id, email, lat, lon, radius_km, phone_number)
+            digests.setdefault(user, []).append((outage, distance))
+
+        for user, user_alerts in digests.items():
+            _add_message(session, user, user_alerts, default_radius_km)
+            queued += 1
+
+        session.execute(
+            update(Notification)
+            .where(Notification.held_at.isnot(None), Notification.user_id.in_(user_ids))
+            .values(held_at=None, sent_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    return queued
+
+
+def delete_user_alerts(session, user_id):
+    """
+    Removes a user's outbox messages and notification rows, which reference
+    users.id, so the user can be deleted. Messages a worker is sending right
+    now still go out; the worker just cannot record them. Nothing is
+    committed.
+    """
+    for model in (OutboxMessage, Notification):
+        session.execute(
+            delete(model).where(model.user_id == user_id).execution_options(synchronize_session=False)
+        )
+
+
+def claim_batch(session, worker_id, batch_size=OUTBOX_BATCH_SIZE, lease_seconds=OUTBOX_LEASE_SECONDS):
+    """
+    Leases up to batch_size pending messages to worker_id and commits the
+    lease. Returns an empty list only when nothing is claimable.
+
+    The claim is a conditional UPDATE that only takes rows whose lease is
+    free or expired, so concurrent workers never lease the same row. On
+    Postgres the candidate SELECT also skips rows other workers have locked.
+    """
+    while True:
+        now = datetime.utcnow()
+        claimable = (
+            (OutboxMessage.status == "pending")
+            & or_(OutboxMessage.lease_expires_at.is_(None), OutboxMessage.lease_expires_at < now)
+        )
+
+        candidates = select(OutboxMessage.id).where(claimable).order_by(OutboxMessage.id).limit(batch_size)
+        if session.get_bind().dialect.name == "postgresql":
+            candidates = candidates.with_for_update(skip_locked=True)
+        candidate_ids = session.scalars(candidates).all()
+
+        if not candidate_ids:
+            session.commit()
+            return []
+
+        session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(candidate_ids))
+            .where(claimable)
+            .values(
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=OutboxMessage.attempts + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+
+        claimed = session.query(OutboxMessage).filter(
+            OutboxMessage.id.in_(candidate_ids),
+            OutboxMessage.lease_owner == worker_id,
+            OutboxMessage.status == "pending",
+        ).all()
+        # Losing every candidate to another worker is not the same as an
+        # empty queue, so look again.
+        if claimed:
+            return claimed
+
+
+def _finish(session, message, worker_id, sent_ok, now):
+    """
+    Records a delivery attempt, but only while worker_id still holds the
+    message's lease. Returns False when the lease was lost: the lease ran
+    out and another worker claimed the message, so that worker owns the
+    outcome now.
+    """
+    if sent_ok:
+        values = {"status": "sent", "sent_at": now, "lease_expires_at": None, "last_error": None}
+    elif message.attempts >= OUTBOX_MAX_ATTEMPTS:
+        values = {"status": "failed", "lease_expires_at": None, "last_error": "delivery failed"}
+    else:
+        # Stays pending, but cannot be claimed again until the delay passes.
+        values = {
+            "lease_expires_at": now + timedelta(seconds=OUTBOX_RETRY_DELAY_SECONDS),
+            "last_error": "delivery failed",
+        }
+
+    result = session.execute(
+        update(OutboxMessage)
+        .where(
+            OutboxMessage.id == message.id,
+            OutboxMessage.lease_owner == worker_id,
+            OutboxMessage.status == "pending",
+        )
+        .values(lease_owner=None, **values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _claim_size(notifiers, batch_size, lease_seconds=OUTBOX_LEASE_SECONDS):
+    """
+    Caps a claim at what the slowest rate-limited channel can send in half
+    the lease, leaving the rest for retries, so rate limiting alone never
+    lets a lease run out mid-batch.
+    """
+    for notifier in notifiers.values():
+        limit = notifier.max_messages(lease_seconds / 2)
+        if limit is not None:
+            batch_size = min(batch_size, limit)
+    return batch_size
+
+
+def drain_outbox(session, SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER, SMTP_PORT,
+                 worker_id=None, batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Claims and delivers batches until no claimable messages are left, each
+    batch split by channel and the channels sent concurrently through their
+    notifiers. Returns (sent, failed) counts. Drains that found work are
+    recorded as the "deliver" pipeline stage.
+    """
+    worker_id = worker_id or new_worker_id()
+    notifiers = build_notifiers(SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER, SMTP_PORT)
+    batch_size = _claim_size(notifiers, batch_size)
+    sent, failed = 0, 0
+    started = time.perf_counter()
+
+    try:
+        while True:
+            batch = claim_batch(session, worker_id, batch_size)
+            if not batch:
+                break
+
+            messages = {message.id: message for message in batch}
+            results = deliver_all(notifiers, [(message, json.loads(message.payload)) for message in batch])
+
+            now = datetime.utcnow()
+            for message_id, sent_ok in results:
+                message = messages[message_id]
+                if not _finish(session, message, worker_id, sent_ok, now):
+                    logger.warning(
+                        "Lost the lease on outbox message %d before recording its delivery (sent: %s).",
+                        message_id, sent_ok,
+                    )
+                NOTIFICATIONS.inc(channel=message.channel or EMAIL, result="sent" if sent_ok else "failed")
+                if sent_ok:
+                    sent += 1
+                else:
+                    failed += 1
+
+            session.commit()
+    except Exception:
+        record_stage("deliver", time.perf_counter() - started, sent, failed=True)
+        raise
+    finally:
+        for notifier in notifiers.values():
+            notifier.close()
+
+    # Idle polls of the outbox worker would only flatten the histogram.
+    if sent or failed:
+        record_stage("deliver", time.perf_counter() - started, sent, failed=bool(failed))
+    return sent, failed
+
+
+if __name__ == "__main__":
+    from db import SessionLocal
+    from logs import configure_logging
+    from metrics import METRICS_PORT, serve_metrics
+
+    configure_logging()
+    if METRICS_PORT:
+        serve_metrics(int(METRICS_PORT))
+
+    worker_id = new_worker_id()
+    logger.info("Outbox worker %s started.", worker_id)
+
+    while True:
+        with SessionLocal() as db_session:
+            sent, failed = drain_outbox(
+                db_session,
+                os.getenv('SENDER_EMAIL'),
+                os.getenv('SENDER_PASSWORD'),
+                os.getenv('SMTP_SERVER'),
+                int(os.getenv('SMTP_PORT')),
+                worker_id=worker_id,
+            )
+        if sent or failed:
+            logger.info("Outbox worker %s: %d sent, %d failed.", worker_id, sent, failed)
+        time.sleep(OUTBOX_POLL_SECONDS)
@@ -0,0 +1,222 @@
+from collections import namedtuple
+from sqlalchemy import select, text
+from geo import KM_PER_DEGREE, haversine_many
+from models import User
+from read_models import ACTIVE_OUTAGES, OutageRow
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+# memory: in-process grid index (geo.outage_index), the default.
+# auto:   pick postgis / rtree from what the database supports, else python.
+# postgis | rtree | python: force a database-side mode.
+PROXIMITY_BACKEND = os.getenv("PROXIMITY_BACKEND", "memory").lower()
+
+# Points per spatial join; rtree binds four parameters per point, so stay
+# well under SQLite's variable limit.
+SPATIAL_POINTS_PER_QUERY = 500
+
+SubscriberRow = namedtuple("SubscriberRow", "id email latitude longitude alert_radius_km phone_number")
+
+# Must match the indexed expressions in install_spatial_indexes exactly.
+_OUTAGE_GEOG = "geography(ST_SetSRID(ST_MakePoint(o.longitude, o.latitude), 4326))"
+_USER_GEOG = "geography(ST_SetSRID(ST_MakePoint(u.longitude, u.latitude), 4326))"
+# PostGIS measures on a slightly different sphere than geo.R; widen the
+# database filter a little and let the exact haversine check decide.
+_SLACK = 1.001
+
+
+def _postgis_available(connection):
+    return connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")).first() is not None
+
+
+def _rtree_available(connection):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'outages_rtree'")
+    ).first() is not None
+
+
+def resolve_backend(connection, configured=None):
+    """Maps the configured backend to one this database can actually serve."""
+    configured = configured or PROXIMITY_BACKEND
+    dialect = connection.dialect.name
+
+    if configured == "memory":
+        return "memory"
+
+    if configured in ("auto", "postgis") and dialect == "postgresql" and _postgis_available(connection):
+        return "postgis"
+    if configured in ("auto", "rtree") and dialect == "sqlite" and _rtree_available(connection):
+        return "rtree"
+
+    if configured not in ("auto", "python"):
+        logger.warning("Proximity backend %r is not available on %s, using python filtering.", configured, dialect)
+    return "python"
+
+
+def _bounding_box(lat, lon, radius_km):
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def outages_near(connection, lat, lon, radius_km, backend):
+    """
+    Returns (distance_km, OutageRow) for active outages within radius_km,
+    closest first. postgis and rtree narrow the candidates with a spatial
+    index; python scans all active outages.
+    """
+    if backend == "postgis":
+        rows = connection.execute(
+            text(
+                "SELECT o.id, o.area, o.sub_areas, o.outage_date, o.outage_time, o.latitude, o.longitude "
+                "FROM outages o WHERE o.retired_at IS NULL AND ST_DWithin("
+                f"{_OUTAGE_GEOG}, geography(ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)), :meters, false)"
+            ),
+            {"lat": lat, "lon": lon, "meters": radius_km * 1000 * _SLACK},
+        )
+    elif backend == "rtree":
+        min_lat, max_lat, min_lon, max_lon = _bounding_box(lat, lon, radius_km)
+        rows = connection.execute(
+            text(
+                "SELECT o.id, o.area, o.sub_areas, o.outage_date, o.outage_time, o.latitude, o.longitude "
+                "FROM outages_rtree r JOIN outages o ON o.id = r.id "
+                "WHERE r.min_lat <= :max_lat AND r.max_lat >= :min_lat "
+                "AND r.min_lon <= :max_lon AND r.max_lon >= :min_lon "
+                "AND o.retired_at IS NULL"
+            ).columns(*ACTIVE_OUTAGES.selected_columns),
+            {"min_lat": min_lat, "max_lat": max_lat, "min_lon": min_lon, "max_lon": max_lon},
+        )
+    else:
+        rows = connection.execute(ACTIVE_OUTAGES)
+
+    outages = [OutageRow(*row) for row in rows if row.latitude is not None and row.longitude is not None]
+    if not outages:
+        return []
+
+    distances = haversine_many(lat, lon, [o.latitude for o in outages], [o.longitude for o in outages])
+    matches = [(float(d), o) for d, o in zip(distances, outages) if d <= radius_km]
+    matches.sort(key=lambda match: match[0])
+    return matches
+
+
+def subscribers_near(connection, points, radius_km, backend, subscribed_only=True):
+    """
+    Returns SubscriberRow records for subscribed users (every located user
+    with subscribed_only=False) that may be within radius_km of any of the
+    (lat, lon) points. Pass the largest alert radius in use. postgis and
+    rtree answer with indexed joins; python returns every candidate user.
+    Callers still apply the exact distance check (see matching.py).
+    """
+    points = sorted(set(points))
+    if not points:
+        return []
+
+    if backend == "postgis":
+        rows = set()
+        for start in range(0, len(points), SPATIAL_POINTS_PER_QUERY):
+            params = {"meters": radius_km * 1000 * _SLACK}
+            values = []
+            for i, (lat, lon) in enumerate(points[start:start + SPATIAL_POINTS_PER_QUERY]):
+                params[f"lat{i}"], params[f"lon{i}"] = lat, lon
+                values.append(f"(CAST(:lat{i} AS double precision), CAST(:lon{i} AS double precision))")
+            rows.update(connection.execute(
+                text(
+                    f"WITH points(lat, lon) AS (VALUES {', '.join(values)}) "
+                    "SELECT DISTINCT u.id, u.email, u.latitude, u.longitude, u.alert_radius_km, u.phone_number FROM points p "
+                    f"JOIN users u ON ST_DWithin({_USER_GEOG}, "
+                    "geography(ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326)), :meters, false)"
+                    + (" WHERE u.is_subscribed = true" if subscribed_only else "")
+                ),
+                params,
+            ))
+    elif backend == "rtree":
+        rows = set()
+        for start in range(0, len(points), SPATIAL_POINTS_PER_QUERY):
+            params = {}
+            boxes = []
+            for i, (lat, lon) in enumerate(points[start:start + SPATIAL_POINTS_PER_QUERY]):
+                params[f"a{i}"], params[f"b{i}"], params[f"c{i}"], params[f"d{i}"] = _bounding_box(
+                    lat, lon, radius_km
+                )
+                boxes.append(f"(:a{i}, :b{i}, :c{i}, :d{i})")
+            rows.update(connection.execute(
+                text(
+                    f"WITH boxes(min_lat, max_lat, min_lon, max_lon) AS (VALUES {', '.join(boxes)}) "
+                    "SELECT DISTINCT u.id, u.email, u.latitude, u.longitude, u.alert_radius_km, u.phone_number FROM boxes b "
+                    "JOIN users_rtree r ON r.min_lat <= b.max_lat AND r.max_lat >= b.min_lat "
+                    "AND r.min_lon <= b.max_lon AND r.max_lon >= b.min_lon "
+                    "JOIN users u ON u.id = r.id"
+                    + (" WHERE u.is_subscribed = 1" if subscribed_only else "")
+                ),
+                params,
+            ))
+    else:
+        query = select(User.id, User.email, User.latitude, User.longitude, User.alert_radius_km, User.phone_number).where(
+            User.latitude.isnot(None),
+            User.longitude.isnot(None),
+        )
+        if subscribed_only:
+            query = query.where(User.is_subscribed == True)
+        rows = connection.execute(query)
+
+    return sorted((SubscriberRow(*row) for row in rows), key=lambda user: user.id)
+
+
+def install_spatial_indexes(connection):
+    """
+    Creates the database-side spatial indexes used by the postgis and rtree
+    backends. Safe to re-run; called from db.init_db.
+    """
+    dialect = connection.dialect.name
+
+    if dialect == "postgresql":
+        try:
+            with connection.begin_nested():
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+        except Exception as e:
+            logger.warning("PostGIS is not available (%s); proximity queries will use python filtering.", e)
+            return
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_outages_geog ON outages USING gist (({_OUTAGE_GEOG.replace('o.', '')}))"
+        ))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_users_geog ON users USING gist (({_USER_GEOG.replace('u.', '')}))"
+        ))
+
+    elif dialect == "sqlite":
+        for table in ("outages", "users"):
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+            ))
+            # Points are stored as zero-area boxes and kept in sync by triggers.
+            connection.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_rtree_insert AFTER INSERT ON {table}
+                WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL
+                BEGIN
+                    INSERT INTO {table}_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+                END
+            """))
+            connection.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_rtree_update AFTER UPDATE OF latitude, longitude ON {table}
+                BEGIN
+                    DELETE FROM {table}_rtree WHERE id = old.id;
+                    INSERT INTO {table}_rtree
+                        SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+                        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+                END
+            """))
+            connection.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_rtree_delete AFTER DELETE ON {table}
+                BEGIN
+                    DELETE FROM {table}_rtree WHERE id = old.id;
+                END
+            """))
+            connection.execute(text(
+                f"INSERT OR REPLACE INTO {table}_rtree "
+                f"SELECT id, latitude, latitude, longitude, longitude FROM {table} "
+                "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+            ))
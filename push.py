@@ -0,0 +1,153 @@
+from versions import OUTAGES, get_version
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How often the broadcaster thread reads the outage data version.
+PUSH_POLL_SECONDS = float(os.getenv("PUSH_POLL_SECONDS", 2))
+# Comment lines keep proxies from closing idle streams.
+PUSH_HEARTBEAT_SECONDS = float(os.getenv("PUSH_HEARTBEAT_SECONDS", 15))
+# Streams end after this long and the browser reconnects, so web threads recycle.
+PUSH_MAX_STREAM_SECONDS = float(os.getenv("PUSH_MAX_STREAM_SECONDS", 300))
+PUSH_RETRY_MS = 5000
+# gunicorn gthread threads per web process; the Procfile passes the same
+# value to --threads.
+WEB_THREADS = int(os.getenv("WEB_THREADS", 32))
+# Each open stream holds a web thread for up to PUSH_MAX_STREAM_SECONDS, so
+# streams may only use what is left after PUSH_RESERVED_THREADS (half the
+# threads, at least 4) are kept for normal requests. PUSH_MAX_STREAMS can
+# lower the cap but not eat into the reserve. Clients over the cap are
+# refused with a 503 and fall back to polling.
+PUSH_RESERVED_THREADS = int(os.getenv("PUSH_RESERVED_THREADS", max(4, WEB_THREADS // 2)))
+PUSH_MAX_STREAMS = max(0, min(
+    int(os.getenv("PUSH_MAX_STREAMS", WEB_THREADS)),
+    WEB_THREADS - PUSH_RESERVED_THREADS,
+))
+# Seconds a refused client waits before trying to stream again.
+PUSH_REFUSED_RETRY_SECONDS = 60
+
+
+class StreamSlots:
+    """Counts open streams in this process and refuses new ones over limit."""
+
+    def __init__(self, limit=PUSH_MAX_STREAMS):
+        self.limit = limit
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self._open >= self.limit:
+                return False
+            self._open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._open -= 1
+
+
+class OutageBroadcaster:
+    """
+    One background thread per process that watches the outages data version
+    and wakes every open stream when the pipeline commits a change.
+
+    Streams never touch the database: they wait on a condition and, when
+    woken, diff what their client has against the shared in-memory index
+    that refresh(version) rebuilt.
+    """
+
+    def __init__(self, session_factory, refresh, poll_seconds=PUSH_POLL_SECONDS):
+        self.session_factory = session_factory
+        # refresh(version) brings the shared index up to that version.
+        self.refresh = refresh
+        self.poll_seconds = poll_seconds
+        self.version = None
+        self._changed = threading.Condition()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._poll()
+            self._thread = threading.Thread(target=self._run, name="outage-broadcaster", daemon=True)
+            self._thread.start()
+
+    def _poll(self):
+        with self.session_factory() as db_session:
+            version, _ = get_version(db_session, OUTAGES)
+        if version == self.version:
+            return
+        self.refresh(version)
+        with self._changed:
+            self.version = version
+            self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self._poll()
+            except Exception:
+                logger.exception("Outage broadcaster poll failed.")
+
+    def wait_for_change(self, seen_version, timeout):
+        """Blocks until the version differs from seen_version or timeout passes."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != seen_version, timeout)
+            return self.version
+
+
+def _event(name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {name}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def outage_stream(broadcaster, snapshot, max_seconds=PUSH_MAX_STREAM_SECONDS,
+                  heartbeat_seconds=PUSH_HEARTBEAT_SECONDS):
+    """
+    Server-Sent Events for one client. snapshot() returns {outage_id: entry}
+    for that client's view (everything, or what is near their location).
+    Sends one "snapshot" event, then a "delta" event with added, updated and
+    removed outages each time the data version changes.
+    """
+    broadcaster.start()
+    deadline = time.monotonic() + max_seconds
+
+    version = broadcaster.version
+    current = snapshot()
+    yield f"retry: {PUSH_RETRY_MS}\n\n"
+    yield _event("snapshot", {"version": version, "outages": list(current.values())}, version)
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+
+        new_version = broadcaster.wait_for_change(version, min(heartbeat_seconds, remaining))
+        if new_version == version:
+            yield ": keepalive\n\n"
+            continue
+
+        version = new_version
+        latest = snapshot()
+        added = [entry for outage_id, entry in latest.items() if outage_id not in current]
+        updated = [
+            entry for outage_id, entry in latest.items()
+            if outage_id in current and current[outage_id] != entry
+        ]
+        removed = [outage_id for outage_id in current if outage_id not in latest]
+        current = latest
+
+        if added or updated or removed:
+            yield _event("delta", {"version": version, "added": added, "updated": updated, "removed": removed}, version)
@@ -0,0 +1,53 @@
+from sqlalchemy import select
+from models import Outage
+
+
+class OutageRow:
+    """Plain read-only record for the outage columns the API serves."""
+
+    __slots__ = ("id", "area", "sub_areas", "outage_date", "outage_time", "latitude", "longitude")
+
+    def __init__(self, id, area, sub_areas, outage_date, outage_time, latitude, longitude):
+        self.id = id
+        self.area = area
+        self.sub_areas = sub_areas
+        self.outage_date = outage_date
+        self.outage_time = outage_time
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+ACTIVE_OUTAGES = (
+    select(
+        Outage.id,
+        Outage.area,
+        Outage.sub_areas,
+        Outage.outage_date,
+        Outage.outage_time,
+        Outage.latitude,
+        Outage.longitude,
+    )
+    .where(Outage.retired_at.is_(None))
+    .order_by(Outage.id)
+)
+
+
+def fetch_active_outages(connection):
+    """
+    Runs a column-only SELECT of the active outages on a Connection or
+    Session and returns OutageRow records, skipping ORM identity-map work.
+    """
+    return [OutageRow(*row) for row in connection.execute(ACTIVE_OUTAGES)]
+
+
+def serialize_outage_list(rows):
+    return [
+        {
+            "id": row.id,
+            "area": row.area,
+            "sub_areas": row.sub_areas.split(",") if row.sub_areas else [],
+            "date": row.outage_date.isoformat() if row.outage_date else None,
+            "time": row.outage_time.isoformat() if row.outage_time else None,
+        }
+        for row in rows
+    ]
@@ -1,79 +1,29 @@
-import requests,random
-from bs4 import BeautifulSoup
+import random
 from datetime import  datetime
-from models import Outage, User, Notification
-from geopy.geocoders import Nominatim
-import math,time
+from geo import DEFAULT_ALERT_RADIUS_KM
+from alert_matches import pending_alerts, refresh_pending_outages
+from sub_areas import link_sub_areas
+from outage_sync import record_fingerprint, scrape_unchanged, sync_outages, table_fingerprint
+from versions import OUTAGES, bump_version
+from geocoding import geocode_area
+from outbox import NOTIFICATION_MODE, drain_outbox, enqueue_alerts, flush_digests, hold_alerts
+from fetcher import fetch_pages, scrape_breaker
+from outage_parser import OutageTableParser, iter_outage_rows, text_chunks
+from metrics import PIPELINE_RUNS, pipeline_stage, record_stage
+import logging
 import os
-import smtplib
-from email.message import EmailMessage
-from urllib.parse import urlencode
+import time
 
+logger = logging.getLogger(__name__)
 
 
-R = 6371
-THRESHOLD_KM = 20
-geolocator = Nominatim(user_agent="gregory_power_tracker_ug_contact_me_at_snowchildwolf@gmail.com")
+# Set to false when dedicated `python outbox.py` workers deliver the queue.
+OUTBOX_INLINE_DRAIN = os.getenv("OUTBOX_INLINE_DRAIN", "true").lower() == "true"
+# Comma separated; every page is fetched concurrently through the proxy.
+UEDCL_OUTAGE_URLS = os.getenv("UEDCL_OUTAGE_URLS", "https://www.uedcl.co.ug/outage-alerts/").split(",")
+SCRAPE_PROXY_ENDPOINT = os.getenv("SCRAPE_PROXY_ENDPOINT", 'https://proxy.scrapeops.io/v1/')
+SCRAPE_FINGERPRINT_NAME = "uedcl_outage_table"
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculates the great-circle distance between two points 
-    on the surface of a sphere (Earth) using the Haversine formula.
-    Returns distance in kilometers.
-    """
-    # Convert degrees to radians
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    # Haversine formula components
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = R * c
-    return distance
-
-def send_outage_email(recipient_email, outage_details, SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER, SMTP_PORT):
-    outage_list_html = "<ul>"
-    for outage in outage_details:
-        # Note: Using 'area' for consistency, ensure this key is correct
-        outage_list_html += f"<li>District: {outage['area']} (Approx. {outage['distance_km']}km away starting <strong>{outage['date']}</strong> at {outage['time']} )</li>"
-    outage_list_html +='</ul>'
-
-    html_content = f"""\
-    <html>
-        <body>
-            <p>Dear Customer,</p>
-            <p>This is an automated power outage alert. Your saved location is within <strong>{THRESHOLD_KM} km</strong> of a scheduled power interruption.</p>
-            <p><strong>Affected Areas Near You:</strong></p>
-            {outage_list_html}
-            <p>Please prepare for the interruption. This alert is based on data provided by Uganda Electricity Distribution Company Limited (UEDCL).</p>
-            <p>Thank you.</p>
-        </body>
-    </html>
-    """
-    msg = EmailMessage()
-    msg['Subject'] = '⚡ URGENT: Scheduled Power Outage Alert Near Your Location'
-    msg['From'] = SENDER_EMAIL
-    msg['To'] = recipient_email
-    msg.set_content('Your client does not support HTML emails. Please upgrade to view the alert.')
-    msg.add_alternative(html_content, subtype='html')
-    
-    try:
-        with smtplib.SMTP(SMTP_SERVER,SMTP_PORT) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL,SENDER_PASSWORD)
-            server.send_message(msg)
-        print(f"SUCCESS: Email sent to {recipient_email}")
-        return True
-    except Exception as e:
-        print(f"FAILURE: Could not send email to {recipient_email}. Error: {e}")
-        return False
-    
 def get_human_headers():
     user_agents = [
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
@@ -99,71 +49,104 @@ def get_human_headers():
 
 
 def scrape_outage_data():
-    target_url = "https://www.uedcl.co.ug/outage-alerts/"
-    api_endpoint = 'https://proxy.scrapeops.io/v1/'
-    outageDict = {}
+    outage_rows = []
     
     SCRAPEOPS_API_KEY = os.getenv('SCRAPEOPS_API_KEY')
     
-    payload = {
-        'api_key': SCRAPEOPS_API_KEY,
-        'url': target_url,
-        'bypass': 'cloudflare_level_1', 
-        'render_js': 'true',            
-        'residential': 'true'         
-    }
+    page_requests = [
+        (SCRAPE_PROXY_ENDPOINT, {
+            'api_key': SCRAPEOPS_API_KEY or '',
+            'url': target_url,
+            'bypass': 'cloudflare_level_1', 
+            'render_js': 'true',            
+            'residential': 'true'         
+        }, None)
+        for target_url in UEDCL_OUTAGE_URLS
+    ]
 
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            print(f"Attempt {attempt + 1}: Sending request to ScrapeOps API...")
-            
-            response = requests.get(api_endpoint, params=urlencode(payload), timeout=120)
-            
-            if response.status_code == 200:
-                print("Success! Data retrieved via ScrapeOps API.")
-                soup = BeautifulSoup(response.text, "html.parser")
-                
-                outage_Table_container = soup.find("table")
-                if not outage_Table_container:
-                    print("Table not found in the returned HTML.")
-                    return None 
-                
-                for row in outage_Table_container.find_all("tr"):
-                    cells = row.find_all("td")
-                    if len(cells) >= 4:
-                        date_time_raw = cells[0].get_text(strip=True).split(" ")
-                        district = cells[1].get_text(strip=True)
-                        status = cells[2].get_text(strip=True)
-                        affected_areas = cells[3].get_text(strip=True)
-                        
-                        if len(date_time_raw) >= 2:
-                            outageDict[district] = {
-                                "Status": status,
-                                "Areas": affected_areas,
-                                "Date": date_time_raw[0],
-                                "Time": date_time_raw[1]
-                            }
-                return outageDict
+    logger.info("Fetching %d outage page(s) via ScrapeOps API...", len(page_requests))
+    with pipeline_stage("fetch") as stage:
+        pages = fetch_pages(page_requests, breaker=scrape_breaker)
+        stage.add(sum(html is not None for html in pages))
 
-            elif response.status_code == 403:
-                print(f"Attempt {attempt + 1}: 403 Forbidden (API Blocked). Check ScrapeOps credits.")
-            else:
-                print(f"Attempt {attempt + 1}: Failed with status {response.status_code}")
+        # A missing page would make its outages look retired, so all pages must succeed.
+        if any(html is None for html in pages):
+            stage.fail()
+            logger.error("Could not fetch every outage page.")
+            return None
 
-        except Exception as e:
-            print(f"Attempt {attempt + 1} Error: {e}")
-        
-        if attempt < max_retries - 1:
-            print("Retrying in 10 seconds...")
-            time.sleep(10)
+    with pipeline_stage("parse") as stage:
+        for target_url, html in zip(UEDCL_OUTAGE_URLS, pages):
+            parser = OutageTableParser()
+            outage_rows.extend(iter_outage_rows(text_chunks(html), parser))
+            if not parser.found_table:
+                stage.fail()
+                logger.error("Table not found in the returned HTML for %s.", target_url)
+                return None
+        stage.add(len(outage_rows))
+
+    logger.info("Retrieved %d outage row(s) via ScrapeOps API.", len(outage_rows))
+    return outage_rows
+
+
+
+def sync_outage_table(session, scraped_rows):
+    """Applies a changed scrape to the outages table. Commits."""
+    geocoding = {"seconds": 0.0, "lookups": 0}
+
+    def timed_geocode(area):
+        started = time.perf_counter()
+        try:
+            return geocode_area(session, area)
+        finally:
+            geocoding["seconds"] += time.perf_counter() - started
+            geocoding["lookups"] += 1
+
+    # Geocoding happens inside sync_outages; it is reported as its own stage.
+    persist_started = time.perf_counter()
+    persisted, persist_failed = 0, True
+    try:
+        _, sync_stats = sync_outages(session, scraped_rows, geocode=timed_geocode)
+        if any(sync_stats.values()):
+            bump_version(session, OUTAGES)
+        session.commit()
+        persisted = sync_stats["inserted"] + sync_stats["updated"] + sync_stats["retired"]
+        persist_failed = False
+    finally:
+        record_stage("geocode", geocoding["seconds"], geocoding["lookups"])
+        record_stage(
+            "persist", time.perf_counter() - persist_started - geocoding["seconds"], persisted, persist_failed
+        )
+    logger.info("Synced %d scraped records: %s", len(scraped_rows), sync_stats)
 
-    return None
 
+def match_and_queue_alerts(session):
+    """
+    Matches outages that have no materialized matches yet, then queues
+    alerts for every unnotified match, or in digest mode holds them and
+    queues the digests that are due. Cheap when nothing changed, so it
+    also runs for unchanged scrapes to pick up users who moved or
+    subscribed since. Nothing is committed.
+    """
+    with pipeline_stage("match") as stage:
+        matched_outages, match_rows = refresh_pending_outages(session, DEFAULT_ALERT_RADIUS_KM)
+        if matched_outages:
+            logger.info("Matched %d outage(s) to %d nearby user(s).", matched_outages, match_rows)
+
+        if NOTIFICATION_MODE == "digest":
+            held = hold_alerts(session, pending_alerts(session))
+            queued = flush_digests(session, DEFAULT_ALERT_RADIUS_KM)
+            logger.info("Held %d alert(s) for digests.", held)
+        else:
+            queued = enqueue_alerts(session, pending_alerts(session), DEFAULT_ALERT_RADIUS_KM)
+            # Alerts held before switching back to immediate mode go out now.
+            queued += flush_digests(session, DEFAULT_ALERT_RADIUS_KM, flush_all=True)
+        stage.add(queued)
+    logger.info("Queued alerts for %d user(s) in the outbox.", queued)
 
 
 def run_full_outage_pipeline(session, SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER, SMTP_PORT):
-    print("starting full ootage ppieline scrape save notify")
+    logger.info("Starting full outage pipeline: scrape, save, notify.")
     
     is_factory = False
     if hasattr(session, '__call__'):
@@ -172,113 +155,62 @@ def run_full_outage_pipeline(session, SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER
     else:
         managed_session = session
 
+    started = time.perf_counter()
+    result = "failed"
     try:
-        outage_data_dict = scrape_outage_data()
+        outage_rows = scrape_outage_data()
         
-        if not outage_data_dict:
-            print("No new data scraped. Stopping pipeline.")
+        if not outage_rows:
+            logger.warning("No new data scraped. Stopping pipeline.")
+            result = "no_data"
             return
         
-        managed_session.query(Outage).delete()
-        
-        newly_saved_outages = [] 
-
-        for area, details in outage_data_dict.items():
-            outage_date_obj = datetime.strptime(details['Date'], "%Y-%m-%d").date()
-            outage_time_obj = datetime.strptime(details['Time'], "%H:%M").time()
-            sub_areas_string = details["Areas"]
-            lat, lon = None, None
-
-            if area:
-                try:
-                    time.sleep(1) 
-                    location = geolocator.geocode(f"{area}, Uganda")
-                    if location:
-                        lat = location.latitude
-                        lon = location.longitude
-                        print(f"Geocoded '{area}': ({lat},{lon})")
-                except Exception as e:
-                    print(f"Geocoding Error for {area}: {e}. Skipping coordinates.")
-
-            new_outage = Outage(
-                area=area,
-                sub_areas=sub_areas_string,
-                outage_date=outage_date_obj,
-                outage_time=outage_time_obj,
-                latitude=lat,
-                longitude=lon
+        scraped_rows = [
+            {
+                "area": row["area"],
+                "sub_areas": row["sub_areas"],
+                "outage_date": datetime.strptime(row["date"], "%Y-%m-%d").date(),
+                "outage_time": datetime.strptime(row["time"], "%H:%M").time(),
+                "status": row["status"],
+            }
+            for row in outage_rows
+        ]
+
+        # Compared on parsed rows, not raw HTML, so page chrome that changes
+        # on every load does not count as a change.
+        digest = table_fingerprint(scraped_rows)
+        if scrape_unchanged(managed_session, SCRAPE_FINGERPRINT_NAME, digest):
+            logger.info("Outage table unchanged (%d records), skipping sync.", len(outage_rows))
+            result = "unchanged"
+        else:
+            sync_outage_table(managed_session, scraped_rows)
+            record_fingerprint(managed_session, SCRAPE_FINGERPRINT_NAME, digest)
+            result = "changed"
+
+        # Links new outages to their sub-areas; also catches up outages
+        # scraped before sub-areas had their own table.
+        link_sub_areas(managed_session)
+
+        # The fingerprint commits with the queued alerts, so a run that fails
+        # before queueing is retried rather than skipped.
+        match_and_queue_alerts(managed_session)
+        managed_session.commit()
+
+        if OUTBOX_INLINE_DRAIN:
+            sent, failed = drain_outbox(
+                managed_session, SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER, SMTP_PORT
             )
+            logger.info("Delivered %d alert(s), %d failed.", sent, failed)
 
-            managed_session.add(new_outage)
-            newly_saved_outages.append(new_outage)
-        
-        managed_session.commit() 
-        print(f"Successfully scraped and saved {len(outage_data_dict)} records.")
-
-        users = managed_session.query(User).filter(
-            User.is_subscribed == True,
-            User.latitude.isnot(None), 
-            User.longitude.isnot(None)
-        ).all()
-        
-        for user in users:
-            proximate_outages = []
-
-            for outage in newly_saved_outages:
-                if not outage.latitude or not outage.longitude:
-                    continue
-
-                already_notified = managed_session.query(Notification).filter(
-                    Notification.user_id == user.id,
-                    Notification.outage_id == outage.id
-                ).first()
-
-                if already_notified:
-                    continue
-
-                distance = haversine_distance(user.latitude, user.longitude, outage.latitude, outage.longitude)
-
-                if distance <= THRESHOLD_KM:
-                    proximate_outages.append({
-                        "id": outage.id,
-                        "area": outage.area,
-                        "distance_km": round(distance, 2),
-                        "date": outage.outage_date.isoformat(), 
-                        "time": outage.outage_time.isoformat(),
-                    })
-            
-            if proximate_outages:
-                print(f"Attempting to alert user {user.email} about {len(proximate_outages)} outage(s)...")
-                
-                email_sent_successfully = send_outage_email(
-                    user.email, 
-                    proximate_outages, 
-                    SENDER_EMAIL, 
-                    SENDER_PASSWORD, 
-                    SMTP_SERVER, 
-                    SMTP_PORT
-                )
-
-                if email_sent_successfully:
-                    for alert in proximate_outages:
-                        new_notification = Notification(
-                            user_id=user.id,
-                            outage_id=alert["id"],
-                            sent_at=datetime.utcnow()
-                        )
-                        managed_session.add(new_notification)
-
-                    managed_session.commit()
-                    print(f"SUCCESS: Notification flags set for {user.email}.")
-
-    except Exception as e:
+    except Exception:
         managed_session.rollback()
-        print(f"ERROR in full pipeline: {e}")
+        logger.exception("Full outage pipeline failed.")
     finally:
         if is_factory:
             managed_session.close()
-        print("===> Full Pipeline Complete <===")
+        PIPELINE_RUNS.inc(result=result)
+        logger.info("Full outage pipeline finished (%s) in %.1fs.", result, time.perf_counter() - started)
 
 if __name__ == "__main__":
    
-    print("Scraper module ready.")
\ No newline at end of file
+    print("Scraper module ready.")
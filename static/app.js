@@ -9,6 +9,10 @@ const searchInput = document.getElementById('outageSearch');
 let userLat;
 let userLon;
 let outagesData;
+let outageStream;
+// Matches PUSH_REFUSED_RETRY_SECONDS on the server.
+const STREAM_REFUSED_RETRY_MS = 60000;
+let locationMode = false;
 const R = 6371; 
 
 function highlightMatch(text, filter) {
@@ -101,9 +105,73 @@ function haversine_distance(lat1, lon1, lat2, lon2) {
     return R * c;
 }
 
+function applyDelta(outages, delta) {
+    const removed = new Set(delta.removed);
+    const changed = new Map([...delta.added, ...delta.updated].map(outage => [outage.id, outage]));
+    const kept = outages.filter(outage => !removed.has(outage.id) && !changed.has(outage.id));
+    return kept.concat([...changed.values()]);
+}
+
+// Server-Sent Events: one snapshot, then only the outages that changed.
+// Returns false when the browser has no EventSource, so callers can poll instead.
+// When the server is at its stream limit it refuses with a 503: onRefused
+// fetches once and the stream is tried again a minute later.
+function openOutageStream(lat, lon, onOutages, onRefused) {
+    if (!window.EventSource) return false;
+    if (outageStream) outageStream.close();
+
+    const query = (lat !== undefined) ? `?lat=${lat}&lon=${lon}` : '';
+    let outages = [];
+    const stream = new EventSource(`/api/outages/stream${query}`);
+    outageStream = stream;
+
+    stream.addEventListener('error', () => {
+        // CLOSED means the browser will not reconnect by itself.
+        if (stream.readyState !== EventSource.CLOSED || outageStream !== stream) return;
+        onRefused();
+        setTimeout(() => {
+            if (outageStream === stream) openOutageStream(lat, lon, onOutages, onRefused);
+        }, STREAM_REFUSED_RETRY_MS);
+    });
+
+    stream.addEventListener('snapshot', (event) => {
+        outages = JSON.parse(event.data).outages;
+        onOutages(outages);
+    });
+    stream.addEventListener('delta', (event) => {
+        outages = applyDelta(outages, JSON.parse(event.data));
+        onOutages(outages);
+    });
+    return true;
+}
+
+function showAllOutages(outages) {
+    outagesData = outages;
+    if (!locationMode) getFilteredOutages(searchInput ? searchInput.value : '');
+}
+
+function watchAllOutages() {
+    locationMode = false;
+    if (!openOutageStream(undefined, undefined, showAllOutages, getOutagesData)) getOutagesData();
+}
+
+function watchNearbyOutages(lat, lon) {
+    locationMode = true;
+    const streaming = openOutageStream(lat, lon, (outages) => {
+        fillTable(outages);
+        statusBar.textContent = outages.length ? "" : "No scheduled outages found near your location.";
+    }, () => check_outages(lat, lon));
+    if (!streaming) {
+        check_outages(lat, lon);
+        return;
+    }
+    checkMyAreaBtn.style.display ="none";
+    resetBtn.style.display = "block";
+}
+
 async function check_outages(lat,lon){
     try{
-        let response = await fetch ( `http://127.0.0.1:5000/api/check_outage?lat=${lat}&lon=${lon}` );
+        let response = await fetch ( `/api/check_outage?lat=${lat}&lon=${lon}` );
         let data = await response.json();
         
         fillTable(data.outages) 
@@ -129,8 +197,8 @@ async function getCoords(){
             (position) => {
                 const a = position.coords.latitude;
                 const b = position.coords.longitude;
-                check_outages(a,b);
                 statusBar.textContent = "";
+                watchNearbyOutages(a,b);
             },
             (error) => {
                 const msg = (error.code === error.PERMISSION_DENIED) ? ' Error: Location access denied. Cannot filter table without location.': ` Error getting location: ${error.message}`;
@@ -150,7 +218,7 @@ async function getOutagesData(){
     
     let data;
     try{
-        const response = await fetch("http://127.0.0.1:5000/api/outages");
+        const response = await fetch("/api/outages");
         statusBar.textContent = "Fetching outages data";
 
         if (!response.ok){
@@ -194,7 +262,7 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 
-getOutagesData();
+watchAllOutages();
 
 if (searchInput) {
     searchInput.addEventListener('keyup', function() {
@@ -214,6 +282,7 @@ if (resetBtn) {
             fillTable(outagesData); 
 
             if (searchInput) searchInput.value = '';
+            watchAllOutages();
 
             checkMyAreaBtn.style.display ="block";
             resetBtn.style.display = "none";
@@ -0,0 +1,196 @@
+"""
+Sub-areas are the villages and trading centres listed under each outage.
+They live in their own table, shared across outages, and are geocoded a
+batch at a time in the background, so matching can measure from their
+points rather than from one district centroid.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, exists, insert, or_, select, update
+from geo import haversine_distance
+from geocoding import GEOCODE_TTL, geocode_area, geocode_sub_area
+from metrics import pipeline_stage
+from models import Outage, OutageSubArea, SubArea
+from versions import OUTAGES, bump_version
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Nominatim allows one request a second, so a batch of 50 uncached names takes about a minute.
+SUBAREA_GEOCODE_BATCH = int(os.getenv("SUBAREA_GEOCODE_BATCH", 50))
+# A sub-area that resolves further than this from its district's centroid is
+# taken to be a namesake elsewhere and ignored.
+SUBAREA_MAX_OFFSET_KM = float(os.getenv("SUBAREA_MAX_OFFSET_KM", 60))
+# New outages are not matched until their sub-areas are geocoded, so alerts
+# are not sent from the coarse district centroid first. After this long
+# they are matched with whatever has resolved, the centroid standing in
+# for the rest.
+SUBAREA_MATCH_MAX_WAIT = timedelta(minutes=int(os.getenv("SUBAREA_MATCH_MAX_WAIT_MINUTES", 30)))
+
+
+def split_sub_areas(sub_areas):
+    """The distinct place names in a scraped, comma separated sub_areas string, in order."""
+    names = []
+    for name in (sub_areas or "").split(","):
+        name = " ".join(name.split())
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def link_sub_areas(session):
+    """
+    Creates the sub_areas rows and outage links for active outages that do
+    not have any yet: new outages, and those scraped before this table
+    existed. Nothing is committed. Returns the number of outages linked.
+    """
+    unlinked = session.execute(
+        select(Outage.id, Outage.area, Outage.sub_areas).where(
+            Outage.retired_at.is_(None),
+            Outage.sub_areas.isnot(None),
+            Outage.sub_areas != "",
+            ~exists().where(OutageSubArea.outage_id == Outage.id),
+        )
+    ).all()
+    if not unlinked:
+        return 0
+
+    wanted = {
+        outage_id: [(area, name) for name in split_sub_areas(sub_areas)]
+        for outage_id, area, sub_areas in unlinked
+    }
+    districts = {area for _, area, _ in unlinked}
+
+    def known_ids():
+        return {
+            (district, name): sub_area_id
+            for sub_area_id, district, name in session.execute(
+                select(SubArea.id, SubArea.district, SubArea.name).where(SubArea.district.in_(districts))
+            )
+        }
+
+    ids = known_ids()
+    missing = {key for keys in wanted.values() for key in keys if key not in ids}
+    if missing:
+        session.execute(insert(SubArea), [{"district": district, "name": name} for district, name in missing])
+        ids = known_ids()
+
+    links = [
+        {"outage_id": outage_id, "sub_area_id": ids[key]}
+        for outage_id, keys in wanted.items()
+        for key in keys
+    ]
+    if links:
+        session.execute(insert(OutageSubArea), links)
+    return len(wanted)
+
+
+def awaiting_geocoding(now, max_wait=SUBAREA_MATCH_MAX_WAIT):
+    """
+    SQL condition on Outage: it has a linked sub-area that was never
+    geocoded and was first seen less than max_wait ago.
+    """
+    return and_(
+        Outage.first_seen_at.isnot(None),
+        Outage.first_seen_at > now - max_wait,
+        exists().where(
+            OutageSubArea.outage_id == Outage.id,
+            SubArea.id == OutageSubArea.sub_area_id,
+            SubArea.geocoded_at.is_(None),
+        ),
+    )
+
+
+def unlink_outages(session, outage_ids):
+    """Removes the sub-area links of outages about to be deleted. Nothing is committed."""
+    session.execute(
+        delete(OutageSubArea)
+        .where(OutageSubArea.outage_id.in_(outage_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def outage_points(connection, outage_ids=None):
+    """
+    {outage_id: [(lat, lon) or None, ...]} with one entry per linked
+    sub-area of the given outages, or of every active outage. None stands
+    for a sub-area that is not geocoded yet or whose point was rejected;
+    geo.outage_locations measures from the district centroid for those.
+    Outages without sub-areas are left out.
+    """
+    query = (
+        select(OutageSubArea.outage_id, SubArea.latitude, SubArea.longitude)
+        .join(SubArea, SubArea.id == OutageSubArea.sub_area_id)
+    )
+    if outage_ids is None:
+        query = query.join(Outage, Outage.id == OutageSubArea.outage_id).where(Outage.retired_at.is_(None))
+    else:
+        query = query.where(OutageSubArea.outage_id.in_(list(outage_ids)))
+
+    points = {}
+    for outage_id, lat, lon in connection.execute(query):
+        resolved = lat is not None and lon is not None
+        points.setdefault(outage_id, []).append((lat, lon) if resolved else None)
+    return points
+
+
+def geocode_pending_sub_areas(session, limit=SUBAREA_GEOCODE_BATCH):
+    """
+    Geocodes up to limit sub-areas of active outages that were never looked
+    up or whose lookup is older than GEOCODE_TTL, through the shared
+    throttled geocode cache. Outages whose points moved are queued for
+    matching again (matched_at = NULL) and the outages version is bumped so
+    web workers rebuild their index. Commits. Returns (looked up, moved).
+    """
+    now = datetime.utcnow()
+    active_sub_areas = (
+        select(OutageSubArea.sub_area_id)
+        .join(Outage, Outage.id == OutageSubArea.outage_id)
+        .where(Outage.retired_at.is_(None))
+    )
+    pending = session.scalars(
+        select(SubArea)
+        .where(
+            SubArea.id.in_(active_sub_areas),
+            or_(SubArea.geocoded_at.is_(None), SubArea.geocoded_at < now - GEOCODE_TTL),
+        )
+        # Never geocoded first.
+        .order_by(SubArea.geocoded_at.isnot(None), SubArea.id)
+        .limit(limit)
+    ).all()
+    if not pending:
+        return 0, 0
+
+    moved = []
+    with pipeline_stage("geocode_sub_areas") as stage:
+        for sub_area in pending:
+            lat, lon = geocode_sub_area(session, sub_area.name, sub_area.district)
+            if lat is not None and lon is not None:
+                centroid_lat, centroid_lon = geocode_area(session, sub_area.district)
+                if centroid_lat is None or centroid_lon is None:
+                    lat, lon = None, None
+                elif haversine_distance(lat, lon, centroid_lat, centroid_lon) > SUBAREA_MAX_OFFSET_KM:
+                    logger.info("Ignoring %s, %s: resolved too far from the district.", sub_area.name, sub_area.district)
+                    lat, lon = None, None
+
+            if (lat, lon) != (sub_area.latitude, sub_area.longitude):
+                moved.append(sub_area.id)
+            sub_area.latitude, sub_area.longitude = lat, lon
+            sub_area.geocoded_at = now
+            stage.add(1)
+
+        if moved:
+            session.execute(
+                update(Outage)
+                .where(
+                    Outage.retired_at.is_(None),
+                    Outage.id.in_(select(OutageSubArea.outage_id).where(OutageSubArea.sub_area_id.in_(moved))),
+                )
+                .values(matched_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            bump_version(session, OUTAGES)
+        session.commit()
+
+    logger.info("Geocoded %d sub-area(s), %d with new coordinates.", len(pending), len(moved))
+    return len(pending), len(moved)
@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from db import init_db, make_engine
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a fresh SQLite file database with the full schema."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'outages.db'}")
+    init_db(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def session(session_factory):
+    with session_factory() as session:
+        yield session
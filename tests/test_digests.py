@@ -0,0 +1,92 @@
+import json
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import scrape_data
+from alert_matches import pending_alerts
+from models import Notification, Outage, OutboxMessage, User, UserOutageMatch
+from outbox import flush_digests, hold_alerts
+
+HELD_AT = datetime(2025, 1, 6, 8, 0)
+INTERVAL = timedelta(minutes=60)
+
+
+@pytest.fixture
+def matches(session):
+    """Two subscribers: the first matched to three outages, the second to one."""
+    users = [User(email=f"user{i}@example.com", is_subscribed=True, latitude=0.3, longitude=32.6) for i in range(2)]
+    outages = [
+        Outage(area=f"District {i}", outage_date=date(2025, 1, 7), outage_time=time(9, 0),
+               latitude=0.3, longitude=32.6, matched_at=HELD_AT)
+        for i in range(3)
+    ]
+    session.add_all(users + outages)
+    session.flush()
+    session.add_all(
+        UserOutageMatch(user_id=users[0].id, outage_id=outage.id, distance_km=1.0 + i)
+        for i, outage in enumerate(outages)
+    )
+    session.add(UserOutageMatch(user_id=users[1].id, outage_id=outages[0].id, distance_km=2.0))
+    session.commit()
+    return users
+
+
+def held(session):
+    return session.query(Notification).filter(Notification.held_at.isnot(None)).count()
+
+
+def hold(session):
+    hold_alerts(session, pending_alerts(session), now=HELD_AT)
+    session.commit()
+
+
+def test_held_alerts_stay_out_of_outbox_until_due(session, matches):
+    hold(session)
+
+    assert flush_digests(session, 20, now=HELD_AT + timedelta(minutes=10), interval=INTERVAL) == 0
+    assert session.query(OutboxMessage).count() == 0
+    assert held(session) == 4
+    # Held alerts still count as notified, so they are not matched again.
+    assert pending_alerts(session) == []
+
+
+def test_due_digest_is_one_message_per_user(session, matches):
+    hold(session)
+
+    assert flush_digests(session, 20, now=HELD_AT + INTERVAL, interval=INTERVAL) == 2
+    session.commit()
+
+    messages = {message.user_id: json.loads(message.payload) for message in session.query(OutboxMessage)}
+    assert session.query(OutboxMessage).count() == 2
+    assert [outage["area"] for outage in messages[matches[0].id]["outages"]] == ["District 0", "District 1", "District 2"]
+    assert [outage["area"] for outage in messages[matches[1].id]["outages"]] == ["District 0"]
+    assert held(session) == 0
+
+    assert flush_digests(session, 20, now=HELD_AT + 2 * INTERVAL, interval=INTERVAL) == 0
+
+
+def test_digest_is_due_early_at_max_alerts(session, matches):
+    hold(session)
+
+    assert flush_digests(session, 20, now=HELD_AT, interval=INTERVAL, max_alerts=3) == 1
+    session.commit()
+
+    assert [message.user_id for message in session.query(OutboxMessage)] == [matches[0].id]
+    assert held(session) == 1
+
+
+def test_switching_to_immediate_mode_flushes_held_alerts(session, matches, monkeypatch):
+    monkeypatch.setattr(scrape_data, "NOTIFICATION_MODE", "digest")
+    scrape_data.match_and_queue_alerts(session)
+    session.commit()
+
+    assert session.query(OutboxMessage).count() == 0
+    assert held(session) == 4
+
+    monkeypatch.setattr(scrape_data, "NOTIFICATION_MODE", "immediate")
+    scrape_data.match_and_queue_alerts(session)
+    session.commit()
+
+    assert sorted(message.user_id for message in session.query(OutboxMessage)) == [user.id for user in matches]
+    assert held(session) == 0
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+import fetcher
+from benchmarks.stubs import StubPageServer
+from fetcher import CircuitBreaker, fetch_pages
+
+
+@pytest.fixture
+def page_server():
+    server = StubPageServer("<html>outages</html>")
+    yield server
+    server.close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(fetcher, "backoff_delay", lambda attempt: 0)
+
+
+def fetch(server, breaker, count=1):
+    return fetch_pages([(server.url, None, None)] * count, breaker=breaker)
+
+
+def test_retries_server_errors(page_server):
+    page_server.statuses = [503, 502]
+    breaker = CircuitBreaker(failure_threshold=5)
+
+    assert fetch(page_server, breaker) == ["<html>outages</html>"]
+    assert page_server.hits == 3
+    assert breaker.state == "closed"
+
+
+def test_does_not_retry_non_retryable_status(page_server):
+    page_server.statuses = [404]
+
+    assert fetch(page_server, CircuitBreaker()) == [None]
+    assert page_server.hits == 1
+
+
+def test_breaker_opens_then_fails_fast(page_server):
+    page_server.statuses = [500, 500, 500]
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+
+    assert fetch(page_server, breaker) == [None]
+    assert breaker.state == "open"
+
+    assert fetch(page_server, breaker) == [None]
+    assert page_server.hits == 3
+
+
+def test_half_open_lets_one_trial_through(page_server):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+    assert breaker.state == "half-open"
+
+    assert sorted(fetch(page_server, breaker, count=3), key=bool) == [None, None, "<html>outages</html>"]
+    assert page_server.hits == 1
+    assert breaker.state == "closed"
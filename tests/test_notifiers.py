@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.stubs import StubSMSServer
+from notifiers import SMSNotifier, sms_text
+
+PAYLOAD = {
+    "radius_km": 20,
+    "outages": [{"id": 1, "area": "Kampala", "date": "2025-01-06", "time": "08:00:00", "distance_km": 3.2}],
+}
+
+
+@pytest.fixture
+def sms_server():
+    server = StubSMSServer()
+    yield server
+    server.close()
+
+
+def sms_messages(count):
+    return [(SimpleNamespace(id=i, recipient=f"+2567000{i:05d}", channel="sms"), PAYLOAD) for i in range(count)]
+
+
+def deliver(server, messages, batch_size=100):
+    notifier = SMSNotifier(url=server.url, api_key="key", batch_size=batch_size, max_workers=2, rate_per_second=0)
+    try:
+        return dict(notifier.deliver(messages))
+    finally:
+        notifier.close()
+
+
+def test_splits_messages_into_batches(sms_server):
+    results = deliver(sms_server, sms_messages(250), batch_size=100)
+
+    assert sorted(sms_server.batch_sizes) == [50, 100, 100]
+    assert sms_server.messages == 250
+    assert len(results) == 250 and all(results.values())
+
+
+def test_maps_statuses_by_message_id(sms_server):
+    sms_server.statuses = {3: "invalid_number", 7: "blocked"}
+
+    results = deliver(sms_server, sms_messages(10))
+
+    assert {message_id for message_id, sent_ok in results.items() if not sent_ok} == {3, 7}
+
+
+def test_message_missing_from_reply_counts_as_failed(sms_server):
+    sms_server.statuses = {4: None}
+
+    results = deliver(sms_server, sms_messages(10))
+
+    assert results[4] is False
+    assert sum(results.values()) == 9
+
+
+def test_error_response_fails_whole_batch(sms_server):
+    sms_server.error_status = 503
+
+    results = deliver(sms_server, sms_messages(30), batch_size=10)
+
+    assert sms_server.requests == 3
+    assert len(results) == 30 and not any(results.values())
+
+
+def test_sms_text_counts_outages_that_do_not_fit():
+    outages = [dict(PAYLOAD["outages"][0], id=i, area=f"District {i}") for i in range(40)]
+
+    text = sms_text({"radius_km": 20, "outages": outages})
+
+    assert len(text) <= 306
+    assert text.endswith(" more")
+    assert text.startswith("Power outage alert near you: District 0 2025-01-06 08:00 (~3km)")
@@ -0,0 +1,77 @@
+import pytest
+
+from benchmarks.bench_parser import FIXTURE, scaled_page, soup_rows
+from outage_parser import iter_outage_rows, text_chunks
+
+
+def parse(html, size=64 * 1024):
+    return list(iter_outage_rows(text_chunks(html, size)))
+
+
+def row(date_time, area, sub_areas, status="Planned"):
+    return f"<tr><td>{date_time}</td><td>{area}</td><td>{status}</td><td>{sub_areas}</td>"
+
+
+def record(area, sub_areas, date="2025-01-06", time="08:00", status="Planned"):
+    return {"area": area, "status": status, "sub_areas": sub_areas, "date": date, "time": time}
+
+
+@pytest.fixture(scope="module")
+def fixture_page():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_rows_without_closing_tags():
+    html = (
+        "<table><thead><tr><th>Date</th><th>District</th><th>Status</th><th>Areas</th>"
+        "<tbody>"
+        + row("2025-01-06 08:00", "Kampala", "Ntinda, Kisaasi")
+        + row("2025-01-07 09:30", "Wakiso", "Nansana")
+        + "</tbody></table><table>" + row("2025-01-08 10:00", "Ignored", "Second table") + "</table>"
+    )
+
+    assert parse(html) == [
+        record("Kampala", "Ntinda, Kisaasi"),
+        record("Wakiso", "Nansana", date="2025-01-07", time="09:30"),
+    ]
+
+
+def test_page_cut_off_inside_the_table_keeps_last_row():
+    html = "<table><tbody>" + row("2025-01-06 08:00", "Kampala", "Ntinda")
+
+    assert parse(html) == [record("Kampala", "Ntinda")]
+
+
+def test_keeps_every_row_for_a_district():
+    html = (
+        "<table><tbody>"
+        + row("2025-01-06 08:00", "Kampala", "Ntinda") + "</tr>"
+        + row("2025-01-06 08:00", "Kampala", "Bukoto") + "</tr>"
+        + row("2025-01-09 14:00", "Kampala", "Ntinda") + "</tr>"
+        + "</tbody></table>"
+    )
+
+    assert parse(html) == [
+        record("Kampala", "Ntinda"),
+        record("Kampala", "Bukoto"),
+        record("Kampala", "Ntinda", date="2025-01-09", time="14:00"),
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 61, 257])
+def test_rows_split_across_chunks(fixture_page, size):
+    assert parse(fixture_page, size) == parse(fixture_page)
+
+
+def test_matches_beautifulsoup_on_fixture(fixture_page):
+    expected = soup_rows(fixture_page)
+
+    assert expected
+    assert parse(fixture_page) == expected
+
+
+def test_matches_beautifulsoup_on_scaled_fixture():
+    html = scaled_page(500)
+
+    assert parse(html, 4096) == soup_rows(html)
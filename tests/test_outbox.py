@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import outbox
+from models import OutboxMessage, User
+from outbox import _finish, claim_batch
+
+
+@pytest.fixture
+def messages(session):
+    user = User(email="user@example.com")
+    session.add(user)
+    session.flush()
+    session.add_all(
+        OutboxMessage(user_id=user.id, recipient=user.email, channel="email", payload="{}")
+        for _ in range(30)
+    )
+    session.commit()
+    return 30
+
+
+def expire_leases(session):
+    session.execute(update(OutboxMessage).values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    session.commit()
+
+
+def test_concurrent_workers_claim_each_message_once(session_factory, messages):
+    def drain(worker_id):
+        claimed = []
+        with session_factory() as session:
+            while batch := claim_batch(session, worker_id, batch_size=3):
+                claimed.extend(message.id for message in batch)
+        return claimed
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        claimed = list(executor.map(drain, [f"worker-{i}" for i in range(4)]))
+
+    all_claimed = [message_id for worker in claimed for message_id in worker]
+    assert len(all_claimed) == messages
+    assert len(set(all_claimed)) == messages
+
+
+def test_second_claim_skips_leased_messages(session_factory, messages):
+    with session_factory() as first, session_factory() as second:
+        first_batch = {message.id for message in claim_batch(first, "worker-a", batch_size=20)}
+        second_batch = {message.id for message in claim_batch(second, "worker-b", batch_size=20)}
+
+        assert len(first_batch) == 20 and len(second_batch) == 10
+        assert not first_batch & second_batch
+        assert claim_batch(first, "worker-a") == []
+
+
+def test_late_finish_after_lease_lost_does_not_apply(session_factory, messages):
+    with session_factory() as first, session_factory() as second:
+        [late] = claim_batch(first, "worker-a", batch_size=1)
+        expire_leases(first)
+        [reclaimed] = claim_batch(second, "worker-b", batch_size=1)
+        assert reclaimed.id == late.id
+
+        assert _finish(first, late, "worker-a", True, datetime.utcnow()) is False
+        first.commit()
+
+        second.refresh(reclaimed)
+        assert reclaimed.status == "pending"
+        assert reclaimed.lease_owner == "worker-b"
+        assert reclaimed.attempts == 2
+
+        assert _finish(second, reclaimed, "worker-b", True, datetime.utcnow()) is True
+        second.commit()
+        second.refresh(reclaimed)
+        assert reclaimed.status == "sent"
+
+
+def test_failed_delivery_waits_out_the_retry_delay(session, messages):
+    [message] = claim_batch(session, "worker-a", batch_size=1)
+
+    assert _finish(session, message, "worker-a", False, datetime.utcnow()) is True
+    session.commit()
+    session.refresh(message)
+
+    assert message.status == "pending"
+    assert message.lease_owner is None
+    assert message.lease_expires_at > datetime.utcnow()
+    assert message.id not in {m.id for m in claim_batch(session, "worker-a", batch_size=messages)}
+
+
+def test_message_fails_at_attempt_limit(session, messages, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 3)
+    session.execute(update(OutboxMessage).where(OutboxMessage.id != 1).values(status="sent"))
+    session.commit()
+
+    for attempt in range(1, 4):
+        [message] = claim_batch(session, "worker-a", batch_size=1)
+        assert message.attempts == attempt
+        assert _finish(session, message, "worker-a", False, datetime.utcnow()) is True
+        session.commit()
+        session.refresh(message)
+        assert message.status == ("failed" if attempt == 3 else "pending")
+        expire_leases(session)
+
+    assert message.last_error == "delivery failed"
+    assert claim_batch(session, "worker-a") == []
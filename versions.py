@@ -0,0 +1,58 @@
+from datetime import datetime
+from sqlalchemy import update
+from models import DataVersion
+import threading
+import time
+
+OUTAGES = "outages"
+
+
+def bump_version(session, name):
+    """
+    Increments the named data version in the caller's transaction, so readers
+    see the new version exactly when the data it describes is committed.
+    """
+    now = datetime.utcnow()
+    result = session.execute(
+        update(DataVersion)
+        .where(DataVersion.name == name)
+        .values(version=DataVersion.version + 1, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        session.add(DataVersion(name=name, version=1, updated_at=now))
+
+
+def get_version(session, name):
+    """Returns (version, updated_at); (0, None) if the data was never published."""
+    row = session.get(DataVersion, name)
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
+
+
+class VersionWatcher:
+    """
+    Caches a data version in-process for up to check_seconds, so hot read
+    paths notice new pipeline runs without a database round trip per request.
+    """
+
+    def __init__(self, session_factory, name, check_seconds):
+        self.session_factory = session_factory
+        self.name = name
+        self.check_seconds = check_seconds
+        self._current = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+            return self._current
+
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.check_seconds:
+                with self.session_factory() as db_session:
+                    self._current = get_version(db_session, self.name)
+                self._checked_at = now
+        return self._current
@@ -0,0 +1,109 @@
+from apscheduler.schedulers.blocking import BlockingScheduler
+from datetime import datetime, timedelta
+from db import SessionLocal
+from locks import acquire_tick, new_owner_id, release_tick, tick_start
+from logs import configure_logging
+from metrics import METRICS_PORT, serve_metrics
+from scrape_data import run_full_outage_pipeline
+from sub_areas import geocode_pending_sub_areas
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+SMTP_SERVER = os.getenv('SMTP_SERVER')
+SMTP_PORT = int(os.getenv('SMTP_PORT'))
+SENDER_EMAIL = os.getenv('SENDER_EMAIL')
+SENDER_PASSWORD = os.getenv('SENDER_PASSWORD')
+
+# Unchanged pages short-circuit after the fetch (see outage_sync.table_fingerprint),
+# so frequent runs are cheap.
+PIPELINE_INTERVAL = timedelta(minutes=int(os.getenv("PIPELINE_INTERVAL_MINUTES", 15)))
+# A run holding the lock longer than this is presumed dead and can be taken over.
+PIPELINE_LOCK_SECONDS = int(os.getenv("PIPELINE_LOCK_SECONDS", 3600))
+PIPELINE_LOCK_NAME = "full_outage_pipeline"
+
+# Sub-areas are geocoded a small batch at a time, between pipeline runs.
+SUBAREA_GEOCODE_INTERVAL = timedelta(minutes=int(os.getenv("SUBAREA_GEOCODE_INTERVAL_MINUTES", 5)))
+SUBAREA_GEOCODE_LOCK_SECONDS = int(os.getenv("SUBAREA_GEOCODE_LOCK_SECONDS", 900))
+SUBAREA_GEOCODE_LOCK_NAME = "sub_area_geocoding"
+
+
+def run_scheduled_pipeline():
+    """
+    Runs the pipeline unless another process already ran it, or is running
+    it, for the current schedule tick. Returns True if this call ran it.
+    """
+    tick = tick_start(datetime.utcnow(), PIPELINE_INTERVAL)
+    owner = new_owner_id()
+
+    with SessionLocal() as db_session:
+        if not acquire_tick(db_session, PIPELINE_LOCK_NAME, tick, owner, PIPELINE_LOCK_SECONDS):
+            logger.info("Pipeline already handled for tick %s, skipping.", tick.isoformat())
+            return False
+
+    try:
+        run_full_outage_pipeline(
+            session=SessionLocal,
+            SENDER_EMAIL=SENDER_EMAIL,
+            SENDER_PASSWORD=SENDER_PASSWORD,
+            SMTP_SERVER=SMTP_SERVER,
+            SMTP_PORT=SMTP_PORT
+        )
+    finally:
+        with SessionLocal() as db_session:
+            release_tick(db_session, PIPELINE_LOCK_NAME, tick, owner)
+
+    return True
+
+
+def run_scheduled_sub_area_geocoding():
+    """One batch of sub-area geocoding per tick across all worker processes."""
+    tick = tick_start(datetime.utcnow(), SUBAREA_GEOCODE_INTERVAL)
+    owner = new_owner_id()
+
+    with SessionLocal() as db_session:
+        if not acquire_tick(db_session, SUBAREA_GEOCODE_LOCK_NAME, tick, owner, SUBAREA_GEOCODE_LOCK_SECONDS):
+            return False
+
+    try:
+        with SessionLocal() as db_session:
+            geocode_pending_sub_areas(db_session)
+    except Exception:
+        logger.exception("Sub-area geocoding failed.")
+    finally:
+        with SessionLocal() as db_session:
+            release_tick(db_session, SUBAREA_GEOCODE_LOCK_NAME, tick, owner)
+
+    return True
+
+
+if __name__ == "__main__":
+    configure_logging()
+    # `python worker.py --once` suits cron / one-off dynos.
+    if "--once" in sys.argv:
+        run_scheduled_pipeline()
+        run_scheduled_sub_area_geocoding()
+        sys.exit(0)
+
+    if METRICS_PORT:
+        serve_metrics(int(METRICS_PORT))
+
+    scheduler = BlockingScheduler(job_defaults={"coalesce": True, "max_instances": 1})
+    scheduler.add_job(
+        run_scheduled_pipeline,
+        id='full_pipeline_job',
+        trigger='interval',
+        seconds=PIPELINE_INTERVAL.total_seconds(),
+        next_run_time=datetime.now(),
+        misfire_grace_time=int(PIPELINE_INTERVAL.total_seconds())
+    )
+    scheduler.add_job(
+        run_scheduled_sub_area_geocoding,
+        id='sub_area_geocoding_job',
+        trigger='interval',
+        seconds=SUBAREA_GEOCODE_INTERVAL.total_seconds(),
+        misfire_grace_time=int(SUBAREA_GEOCODE_INTERVAL.total_seconds())
+    )
+    scheduler.start()